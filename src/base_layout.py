@@ -1,61 +1,79 @@
 from net_metrics import construct_dataframe, sort_by_column
-from test import distinct_chars, bigram_probability, pi_vec, p_matrix, a_matrix
+from partition import balanced_bisection, finger_partition
+from partition_metrics import partition_metrics
+from corpus_stats import CorpusStats
+from stats_cache import StatsCache
 from visualization import visualize_keyboard_seaborn
+from keyboard import STANDARD, KeyboardGeometry
 import pandas as pd
 import numpy as np
 import networkx as nx
 import text_parser as tp
-import random
 from typing import Literal, TypeAlias
 import argparse
 import matplotlib.pyplot as plt
 
 Metric: TypeAlias = Literal['Average', 'Degree', 'Eigenvector', 'Betweenness', 'Closeness', 'PageRank']
 
-def swap(l1, l2, i1, i2):
-    tmp = l1[i1]
-    l1[i1] = l2[i2]
-    l2[i2] = tmp
+def part_labels(G : nx.DiGraph, *parts : list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Weight matrix of the graph and the label of every node: the index of the part listing it, -1 if none does.
+    """
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    labels = np.full(len(nodes), -1)
+    for label, part in enumerate(parts):
+        labels[[index[node] for node in part]] = label
+    return nx.to_numpy_array(G, nodelist=nodes), labels
 
 def sum_between(G : nx.DiGraph, t1 : list, t2 : list) -> float:
     """
     Check edge weight sum between 2 subgraphs. Nodes of each subgraph are listed in t1 and t2.
     """
-    return sum([G.get_edge_data(u, v)['weight'] for u, v in G.edges if ((u in t1 and v in t2) or (u in t2 and v in t1))])
+    W, labels = part_labels(G, t1, t2)
+    return float(partition_metrics(W, labels, k=2)[1])
 
 def sum_within(G : nx.DiGraph, t : list) -> float:
     """
     Check edge weight sum within a subgraph. Nodes of the subgraph are listed in t.
     """
-    s = G.subgraph(t)
-    return np.sum([G.get_edge_data(u, v)['weight'] for u, v in s.edges()])
+    W, labels = part_labels(G, t)
+    return float(partition_metrics(W, labels, k=1)[0][0])
 
-def split_graph(G : nx.DiGraph, df: pd.DataFrame) -> tuple[list, list]:
+def split_graph(G : nx.DiGraph, df: pd.DataFrame, mode: str = "random", seed: int | None = None,
+                iterations: int = 1000) -> tuple[list, list]:
     """
     Split the graph on 2 subgraphs so that they are balanced in the weight they hold. 
     Each subgraphs internal edges should hold ~0.25 of the weights , and the edges between them should hold ~0.5.
+    Starts from the nodes ordered by degree, dealt alternately, the two nodes with the highest degree stay on their sides.
+    mode "random" keeps random swaps that do not worsen the balance, "greedy" makes Kernighan-Lin passes of best swaps.
     """
-    s_data = sort_by_column(df, 'Degree')
-    order = list(s_data.index)
-    t1 =[order[i] for i in range(len(order)) if i % 2 == 0]
-    t2 = [order[i] for i in range(len(order)) if i % 2 == 1]
-
-    for _ in range(1000):
-        w1 = sum_within(G, t1) # weights in subgraph 1
-        w2 = sum_within(G, t2) # weights in subgraph 2
-        diff = abs(w1-w2) # difference in weights between subgraphs
-        if diff < 0.0001: # end early if difference is small enough
-            break
-        r1 = random.randint(1, len(t1)-1) # randomly select a node from subgraph 1
-        r2 = random.randint(1, len(t1)-1) # randomly select a node from subgraph 2
-        swap(t1, t2, r1, r2) # swap randomly selected nodes
-        w1 = sum_within(G, t1) # recalculate weight sum in subgraph 1
-        w2 = sum_within(G, t2) # recalculate weight sum in subgraph 2
-        if diff < abs(w1-w2): # if the balance improved keep the change, otherwise swap back
-            swap(t1, t2, r1, r2) # swap back
-
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    W = nx.to_numpy_array(G, nodelist=nodes)
+    order = [index[node] for node in sort_by_column(df, 'Degree').index]
+    part = np.zeros(len(nodes), dtype=bool)
+    part[order[::2]] = True
+    part = balanced_bisection(W, part, mode=mode, seed=seed, iterations=iterations, fixed=order[:2])
+
+    t1 = [nodes[i] for i in order if part[i]]
+    t2 = [nodes[i] for i in order if not part[i]]
     return t1, t2 # return the nodes of each subgraph
 
+def finger_split(G : nx.DiGraph, df: pd.DataFrame, pi : list, geometry: KeyboardGeometry = STANDARD,
+                 processes: int | None = 1) -> tuple[list, list]:
+    """
+    Split the graph on the hands of the geometry with the finger partitioner (least weight between the fingers,
+    pi balanced by key capacity). Returns the nodes of each hand ordered by degree.
+    A process pool (processes other than 1) only pays off for graphs much larger than one keyboard.
+    """
+    nodes = list(G.nodes)
+    fingers = finger_partition(nx.to_numpy_array(G, nodelist=nodes), np.asarray(pi), geometry, processes=processes)
+    right = set(geometry.fingers[geometry.hands].tolist())
+    hand = dict(zip(nodes, [finger in right for finger in fingers.tolist()]))
+    order = list(sort_by_column(df, 'Degree').index)
+    return [node for node in order if not hand[node]], [node for node in order if hand[node]]
+
 def visualize_split(G : nx.DiGraph, pi : list, dc : list, t1 : list, t2 : list):
     color_map = []
     for node in G:
@@ -110,9 +128,8 @@ def check_balance(G : nx.DiGraph, t1 : list, t2 : list):
     Prints out the weight sum of each subgraphs internal edges (~0.25), 
     weight sum between subgraphs (~0.5) and a total weight sum (1).
     """
-    w1 = sum_within(G, t1)
-    w2 = sum_within(G, t2)
-    w3 = sum_between(G, t1, t2)
+    W, labels = part_labels(G, t1, t2)
+    (w1, w2), w3, _ = partition_metrics(W, labels, k=2)
     sum_w = w1+w2+w3
     print(f"T1 holds: {round(w1, 3)}, T2 holds: {round(w2, 3)}, edges between hold: {round(w3, 3)}, sums to: {round(sum_w, 3)}")
 
@@ -218,16 +235,20 @@ def determine_key_layout(G : nx.DiGraph, subgraph_nodes : list) -> np.array:
 def place_labels(key_array, labels):
     return np.vectorize(labels.get)(key_array)
 
-def full_layout(G : nx.DiGraph, metric : Metric, dc : list, pi : list) -> np.array:
+def full_layout(G : nx.DiGraph, metric : Metric, dc : list, pi : list, split: str = "random", seed: int | None = None) -> np.array:
     """
     Creates a layout for each hand (half of the keyboard) before joining them into a full keyboard layout.
+    split selects the bisection mode (random, greedy or the hands of the finger partition), seed makes it reproducible.
     """
 
-    # check centrality measures, save to pandas dataframe
-    data = construct_dataframe(G, dc)
+    # check centrality measures, save to pandas dataframe (the split orders the nodes by degree)
+    data = construct_dataframe(G, dc, metrics=None if metric == 'Average' else ['Degree', metric])
 
     # split the graph on 2 subgraphs (balanced by amount of weight they hold)
-    t1, t2 = split_graph(G, data)
+    if split == "fingers":
+        t1, t2 = finger_split(G, data, pi, processes=1)
+    else:
+        t1, t2 = split_graph(G, data, mode=split, seed=seed)
     visualize_split(G, pi, dc, t1, t2)
 
     left = data.loc[t1]
@@ -255,20 +276,53 @@ if __name__ == "__main__":
                         required=False, 
                         action='store', 
                         default="Degree")
+    parser.add_argument("--clear-cache",
+                        help="Recompute the corpus statistics instead of loading them from the cache.",
+                        action='store_true')
+    parser.add_argument("--corpus",
+                        help="Text files or directories of .txt files to use instead of War and Peace.",
+                        nargs='+',
+                        default=None)
+    parser.add_argument("--weights",
+                        help="Mixing weight of each corpus (all files of a directory are one corpus).",
+                        nargs='+',
+                        type=float,
+                        default=None)
+    parser.add_argument("--processes",
+                        help="Number of processes used for counting the corpora.",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--split",
+                        help="Hands split: random swaps, greedy Kernighan-Lin passes or the finger partition.",
+                        choices=["random", "greedy", "fingers"],
+                        default="random")
+    parser.add_argument("--seed",
+                        help="Seed of the hands split.",
+                        type=int,
+                        default=None)
 
     args = parser.parse_args()
     metric = args.metric
 
     # build directional graph based on choosen text
-    seq = tp.parse_text("./data/war_and_peace_by_tolstoy.txt", )
-    seq = seq[seq.find("well,prince")-9:]
-    text = seq
-    dc = distinct_chars(text=text)
-    bp, bs = bigram_probability(text=text)
-
-    p = p_matrix(chars=dc, probabilities=bp)
-    a = a_matrix(chars=dc, bigrams=bs)
-    pi = pi_vec(a_matrix=a)
+    def book_stats(path: str) -> CorpusStats:
+        seq = tp.parse_text(path)
+        seq = seq[seq.find("well,prince")-9:]
+        return CorpusStats.from_text(seq)
+
+    if args.corpus is not None:
+        stats = CorpusStats.from_corpora(args.corpus, weights=args.weights, processes=args.processes)
+    else:
+        corpus = "./data/war_and_peace_by_tolstoy.txt"
+        cache = StatsCache()
+        if args.clear_cache:
+            cache.invalidate(corpus, variant="well,prince")
+        stats = cache.get(corpus, variant="well,prince", compute=book_stats)
+    dc = stats.chars
+
+    p = stats.P
+    pi = stats.pi
 
     print("Keys ordered by pi:")
     print(np.flip(np.array(dc)[pi.argsort()]))
@@ -278,7 +332,7 @@ if __name__ == "__main__":
     print(f"Number of letters: {len(G)}")
 
     # build keyboard layout (based on the split)
-    keyboard = full_layout(G, metric, dc, pi)
+    keyboard = full_layout(G, metric, dc, pi, split=args.split, seed=args.seed)
 
     print()
     print(keyboard[:10])
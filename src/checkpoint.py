@@ -0,0 +1,41 @@
+import os
+import json
+import random
+import tempfile
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def save_checkpoint(path: str, arrays: dict[str, np.ndarray], meta: dict) -> None:
+    """
+    Writes arrays and the JSON serializable meta into one .npz file, together with the state of the random module.
+    The file is written to a temporary file first, so a run killed while saving keeps its previous checkpoint.
+    """
+    version, state, gauss = random.getstate()
+    meta = dict(meta, format=FORMAT_VERSION, random_version=version, random_gauss=gauss)
+    arrays = dict(arrays, random_state=np.array(state, dtype=np.uint32), meta=np.array(json.dumps(meta)))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def load_checkpoint(path: str) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Reads a checkpoint written by save_checkpoint and restores the state of the random module.
+    Returns the arrays and meta.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    meta = json.loads(str(arrays.pop("meta")))
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Checkpoint {path} has format {meta.get('format')}, expected {FORMAT_VERSION}")
+    state = tuple(int(x) for x in arrays.pop("random_state"))
+    random.setstate((meta["random_version"], state, meta["random_gauss"]))
+    return arrays, meta
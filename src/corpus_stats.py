@@ -0,0 +1,271 @@
+import os
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from typing import Iterable, Mapping, Optional, Sequence
+from ngrams import NgramCounter, Trigrams, boundary_counts, boundary_trigrams
+from stationary import stationary_distribution
+from text_parser import PATTERN, RANGE_BYTES, iter_text_chunks, split_ranges
+
+
+def pi_vec(a_matrix: np.ndarray) -> np.ndarray:
+    """
+    Stationary probability vector
+    """
+    return stationary_distribution(a_matrix)[0]
+
+def bigram_matrix(chars: list[str], bigrams: Mapping[str, float]) -> np.ndarray:
+    """
+    Turns a {bigram: value} mapping (e.g. the Counter from bigram_probability) into a matrix indexed by chars.
+    """
+    index = {c: i for i, c in enumerate(chars)}
+    values = np.array(list(bigrams.values()))
+    m = np.zeros(shape=(len(chars), len(chars)), dtype=values.dtype if len(values) else np.int64)
+    rows = [index[k[0]] for k in bigrams]
+    cols = [index[k[1]] for k in bigrams]
+    m[rows, cols] = values
+    return m
+
+def corpus_files(corpora: str | Sequence[str]) -> list[list[str]]:
+    """
+    Resolves a corpus argument (a file, a directory of .txt files or a list of those) into the files of every corpus.
+    A file listed more than once is only kept in the first corpus that lists it.
+    """
+    if isinstance(corpora, str):
+        corpora = [corpora]
+    seen = set()
+    files = []
+    for corpus in corpora:
+        if os.path.isdir(corpus):
+            paths = sorted(os.path.join(corpus, name) for name in os.listdir(corpus) if name.endswith(".txt"))
+        else:
+            paths = [corpus]
+        files.append([])
+        for path in paths:
+            if os.path.realpath(path) not in seen:
+                seen.add(os.path.realpath(path))
+                files[-1].append(path)
+    return files
+
+def corpus_paths(corpora: str | Sequence[str]) -> list[str]:
+    """
+    All files of a corpus argument, see corpus_files.
+    """
+    return [path for paths in corpus_files(corpora) for path in paths]
+
+def _count_range(task: tuple) -> tuple[list[str], np.ndarray, np.ndarray, Optional[Trigrams], str, str]:
+    """
+    Worker of CorpusStats.from_corpora, counts one byte range of a corpus.
+    """
+    path, start, end, pattern, chars, skip, trigrams = task
+    counter = NgramCounter(chars=chars, skips=(skip,), trigrams=trigrams)
+    counter.update(iter_text_chunks(path, pattern=pattern, start=start, end=end))
+    return counter.chars, counter.bigrams[skip], counter.unigrams, counter.trigrams, counter.head, counter.tail
+
+
+class CorpusStats():
+    """
+    Corpus statistics derived from a single bigram count matrix (counts[i, j] counts chars[i] followed by chars[j]
+    after skip letters). P, A and pi are computed on first access and cached, update() adds new text to the counts.
+    tail holds the last characters of the corpus, so updates continue the text seamlessly.
+    Optionally sparse trigram counts (ngrams.Trigrams, coded by the position of each letter in chars) are kept as well.
+    """
+    def __init__(self, counts: np.ndarray, chars: list[str], unigrams: Optional[np.ndarray] = None, skip: int = 0, tail: str = "",
+                 trigrams: Optional[Trigrams] = None) -> None:
+        if counts.shape != (len(chars), len(chars)):
+            raise ValueError(f"Count matrix of shape {counts.shape} does not match an alphabet of {len(chars)} characters")
+        self.counts = counts
+        self.chars = list(chars)
+        self.unigrams = unigrams
+        self.skip = skip
+        self.tail = tail
+        self.trigrams = trigrams
+        self._previous_pi = None
+
+    @classmethod
+    def from_text(cls, text: str | Iterable[str], chars: Optional[list[str]] = None, skip: int = 0, trigrams: bool = False) -> "CorpusStats":
+        """
+        Counts the bigrams of text (a string or a stream of chunks from text_parser.iter_text_chunks).
+        Without an explicit alphabet the characters of the text are used in sorted order.
+        Set skip=1 to build the statistics from skip-letter bigrams instead, and trigrams to also count trigrams.
+        """
+        counter = NgramCounter(chars=chars, skips=(skip,), trigrams=trigrams).update(text)
+        stats = cls(counter.bigrams[skip], counter.chars, counter.unigrams, skip, counter.tail, counter.trigrams)
+        return stats if chars is not None else stats.reorder(sorted(counter.chars))
+
+    @classmethod
+    def from_counter(cls, chars: list[str], bigrams: Counter[str]) -> "CorpusStats":
+        return cls(bigram_matrix(chars, bigrams), chars)
+
+    @classmethod
+    def from_corpora(cls, corpora: str | Sequence[str], weights: Optional[Sequence[float]] = None, chars: Optional[list[str]] = None,
+                     skip: int = 0, pattern: str = PATTERN, processes: Optional[int] = None, range_bytes: int = RANGE_BYTES,
+                     trigrams: bool = False) -> "CorpusStats":
+        """
+        Statistics of several corpora (files, directories of .txt files) mixed with the given weights (see merge),
+        one weight per corpus: the files of a directory are summed into one corpus.
+        Every file is split into byte ranges that are counted in a process pool (processes=1 counts in this process),
+        the bigrams across range boundaries are added back when the ranges are joined.
+        """
+        files = corpus_files(corpora)
+        if weights is not None and len(weights) != len(files):
+            raise ValueError(f"Got {len(weights)} weights for {len(files)} corpora")
+        if weights is None:
+            files = [corpus for corpus in files if corpus]
+        elif not all(files):
+            raise ValueError("Every weighted corpus needs at least one file that no earlier corpus lists")
+        paths = [path for corpus in files for path in corpus]
+        tasks = [(path, start, end, pattern, chars, skip, trigrams) for path in paths for start, end in split_ranges(path, range_bytes)]
+        if processes == 1:
+            results = list(map(_count_range, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(_count_range, tasks))
+
+        if chars is None:
+            chars = sorted(set().union(*(r[0] for r in results)))
+        context = max(skip + 1, 2 if trigrams else 0)
+        per_file = {}
+        for path in paths:
+            counts = np.zeros(shape=(len(chars), len(chars)), dtype=np.int64)
+            unigrams = np.zeros(len(chars), dtype=np.int64)
+            joined = Trigrams() if trigrams else None
+            tail = ""
+            for task, (r_chars, r_counts, r_unigrams, r_trigrams, head, r_tail) in zip(tasks, results):
+                if task[0] != path:
+                    continue
+                part = cls(r_counts, r_chars, r_unigrams, trigrams=r_trigrams).reorder(chars)
+                counts += part.counts + boundary_counts(tail, head, chars, skip)
+                unigrams += part.unigrams
+                if trigrams:
+                    joined.add(part.trigrams).add(boundary_trigrams(tail, head, chars))
+                tail = (tail + r_tail)[-context:]
+            per_file[path] = cls(counts, chars, unigrams, skip, tail, joined)
+        per_corpus = [cls.merge([per_file[path] for path in corpus], chars=chars) for corpus in files]
+        return cls.merge(per_corpus, weights=weights, chars=chars)
+
+    @classmethod
+    def merge(cls, stats: Sequence["CorpusStats"], weights: Optional[Sequence[float]] = None, chars: Optional[list[str]] = None) -> "CorpusStats":
+        """
+        Combines the statistics of several corpora over a shared alphabet (by default the sorted union).
+        Without weights the integer counts are simply summed. With weights every corpus contributes
+        weights[i] / sum(weights) of the total count mass, regardless of its size.
+        """
+        skips = {s.skip for s in stats}
+        if len(skips) > 1:
+            raise ValueError(f"Cannot merge statistics with different skips {sorted(skips)}")
+        skip = skips.pop()
+        # the merged text has no single ending, so only a lone corpus keeps its tail
+        tail = stats[0].tail if len(stats) == 1 else ""
+        if chars is None:
+            chars = sorted(set().union(*(s.chars for s in stats)))
+        aligned = [s.reorder(chars) for s in stats]
+        with_unigrams = all(s.unigrams is not None for s in aligned)
+        with_trigrams = all(s.trigrams is not None for s in aligned)
+
+        def scales(totals: list[float]) -> np.ndarray:
+            # factor of each corpus, so that it holds weights[i] / sum(weights) of the total
+            if weights is None:
+                return np.ones(len(totals))
+            totals = np.asarray(totals, dtype=float)
+            w = np.asarray(weights, dtype=float) / np.sum(weights)
+            return np.divide(w * totals.sum(), totals, out=np.zeros(len(totals)), where=totals > 0)
+
+        def mix(arrays: list[np.ndarray]) -> np.ndarray:
+            if weights is None:
+                return sum(arrays)
+            return sum(a * f for a, f in zip(arrays, scales([a.sum() for a in arrays])))
+
+        unigrams = mix([s.unigrams for s in aligned]) if with_unigrams else None
+        trigrams = None
+        if with_trigrams:
+            trigrams = Trigrams()
+            for s, f in zip(aligned, scales([s.trigrams.total() for s in aligned])):
+                trigrams.add(s.trigrams, scale=f)
+        return cls(mix([s.counts for s in aligned]), chars, unigrams, skip, tail, trigrams)
+
+    def reorder(self, chars: list[str]) -> "CorpusStats":
+        """
+        Same statistics over another ordering of the alphabet, characters that only appear in chars get zero counts.
+        """
+        missing = set(self.chars).difference(chars)
+        if missing:
+            raise ValueError(f"Characters {sorted(missing)} are missing from the new alphabet")
+        index = {c: i for i, c in enumerate(chars)}
+        position = [index[c] for c in self.chars]
+        counts = np.zeros(shape=(len(chars), len(chars)), dtype=self.counts.dtype)
+        counts[np.ix_(position, position)] = self.counts
+        unigrams = None
+        if self.unigrams is not None:
+            unigrams = np.zeros(len(chars), dtype=self.unigrams.dtype)
+            unigrams[position] = self.unigrams
+        trigrams = self.trigrams.recode(np.array(position, dtype=np.int64)) if self.trigrams is not None else None
+        return CorpusStats(counts, chars, unigrams, self.skip, self.tail, trigrams)
+
+    def update(self, text: str | Iterable[str]) -> "CorpusStats":
+        """
+        Adds the counts of new text (continuing the corpus after tail) in place. Only the new text is counted,
+        new characters are appended to the alphabet. P and PI are rebuilt from the counts, A only in the rows
+        that changed and pi is recomputed lazily, warm started from its previous value.
+        """
+        counter = NgramCounter(chars=self.chars, skips=(self.skip,), grow=True, tail=self.tail, trigrams=self.trigrams is not None)
+        counter.update(text)
+        if self.trigrams is not None:
+            self.trigrams.add(counter.trigrams)
+        n_old, n = self.n, counter.n
+        delta = counter.bigrams[self.skip]
+        counts = np.pad(self.counts, (0, n-n_old)) if n > n_old else self.counts
+        counts += delta.astype(counts.dtype, copy=False)
+        self.counts = counts
+        if self.unigrams is not None:
+            self.unigrams = np.pad(self.unigrams, (0, n-n_old)) + counter.unigrams
+        self.chars = counter.chars
+        self.tail = counter.tail
+
+        if "pi" in self.__dict__:
+            self._previous_pi = np.pad(self.pi, (0, n-n_old))
+        if "A" in self.__dict__ and n == n_old:
+            changed = np.flatnonzero(delta.sum(axis=1))
+            rows = counts[changed].sum(axis=1, keepdims=True)
+            self.A[changed] = np.divide(counts[changed], rows, out=np.zeros((len(changed), n)), where=rows > 0)
+        else:
+            self.__dict__.pop("A", None)
+        for name in ("P", "pi", "PI"):
+            self.__dict__.pop(name, None)
+        return self
+
+    @property
+    def n(self) -> int:
+        return len(self.chars)
+
+    @cached_property
+    def P(self) -> np.ndarray:
+        """
+        Probability matrix (normalized joint bigram distribution)
+        """
+        total = self.counts.sum()
+        return self.counts / total if total else np.zeros(self.counts.shape)
+
+    @cached_property
+    def A(self) -> np.ndarray:
+        """
+        Stochastic matrix (Markov transition matrix), rows of characters that are never followed stay 0
+        """
+        rows = self.counts.sum(axis=1, keepdims=True)
+        return np.divide(self.counts, rows, out=np.zeros(self.counts.shape), where=rows > 0)
+
+    @cached_property
+    def pi(self) -> np.ndarray:
+        """
+        Stationary probability vector, the solver diagnostics are kept in pi_info
+        """
+        pi, self.pi_info = stationary_distribution(self.A, pi0=self._previous_pi)
+        return pi
+
+    @cached_property
+    def PI(self) -> np.ndarray:
+        """
+        Pi matrix
+        """
+        return np.diag(self.pi)
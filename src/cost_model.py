@@ -0,0 +1,308 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Sequence
+from ngrams import Trigrams
+from keyboard import STANDARD, KeyboardGeometry
+
+SWAP_TABLE_THRESHOLD = 8 # number of swaps from which swap_deltas precomputes single character moves
+CACHE_SIZE = 2**16 # layouts kept by a FitnessCache
+
+
+def swap_pairs(groups: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    All swaps (i, j), i < j, of two keys from the same group (e.g. [HOMEROW, OTHER]) as a (n_pairs, 2) array.
+    """
+    pairs = [(g[x], g[y]) for g in groups for x in range(len(g)) for y in range(x+1, len(g))]
+    return np.array(pairs, dtype=np.intp).reshape(-1, 2)
+
+
+class CostModel():
+    """
+    Layout cost from the report:
+        C(E) = E P * (w1 F + w2 D) - w3 diag(E pi) R,   c = sum_ij C_ij
+    optionally plus the trigram term w4 * sum_abc p(abc) T[pos(a), pos(b), pos(c)], which is evaluated
+    over the nonzero trigrams only.
+    A layout is a permutation array, permutation[i] is the index of the character on key i.
+
+    Since E P only permutes the rows of P, the first two terms are a linear assignment cost:
+        c = sum_k L[k, permutation[k]],   L = P (w1 F + w2 D)^T - w3 diag(R) pi^T
+    so whole populations are scored with one gather from the precomputed L, and swapping two keys
+    changes the cost by four entries of L (plus the trigrams that contain one of the two characters).
+    """
+    def __init__(self, P: np.ndarray, F: np.ndarray, D: np.ndarray, R: np.ndarray, pi: np.ndarray,
+                 w1: float = 0.6, w2: float = 0.3, w3: float = 1.0,
+                 trigrams: Optional[Trigrams] = None, T: Optional[np.ndarray] = None, w4: float = 0.5,
+                 geometry: Optional[KeyboardGeometry] = None) -> None:
+        self.P, self.F, self.D, self.R, self.pi = P, F, D, R, pi
+        self.geometry = geometry # keyboard F, D, R and T come from, if any
+        self.w1 = w1 # Same finger bigram weight
+        self.w2 = w2 # Distance weight
+        self.w3 = w3 # Preferred position weight
+        self.w4 = w4 # Trigram weight
+        self.M = w1*F + w2*D
+        self.r = np.diag(R)
+        self.L = P @ self.M.T - w3 * np.outer(self.r, pi)
+        self.T = T
+        self.trigrams = trigrams if T is not None else None
+        if self.trigrams is not None:
+            self.abc = tuple(x.astype(np.intp) for x in self.trigrams.codes())
+            self.p3 = self.trigrams.frequencies()
+            a, b, c = self.abc
+            # indexes of the trigrams that contain each character
+            self.containing = [np.flatnonzero((a == x) | (b == x) | (c == x)) for x in range(len(pi))]
+            self.repeated = [np.flatnonzero((a == x).astype(int) + (b == x) + (c == x) > 1) for x in range(len(pi))]
+            self._pair_cache = {}
+            # W[x, t] = p(t) if character x is the given letter of trigram t and occurs in it only once
+            once = ((a != b) & (a != c), (b != a) & (b != c), (c != a) & (c != b))
+            self._single_weights = tuple(np.where((np.arange(len(pi))[:, None] == v) & o, self.p3, 0.0)
+                                         for v, o in zip(self.abc, once))
+
+    @classmethod
+    def from_geometry(cls, geometry: KeyboardGeometry, P: np.ndarray, pi: np.ndarray, trigrams: Optional[Trigrams] = None,
+                      **weights: float) -> "CostModel":
+        """
+        Cost model with the F, D, R (and with trigrams T) matrices of a keyboard geometry.
+        If the board has more keys than there are characters, P and pi are padded with empty characters
+        that are never typed (e.g. for the thumb keys of a 34 key board).
+        """
+        pad = geometry.n - len(pi)
+        if pad < 0:
+            raise ValueError(f"{len(pi)} characters do not fit on {geometry}")
+        P, pi = np.pad(P, (0, pad)), np.pad(pi, (0, pad))
+        T = geometry.T if trigrams is not None else None
+        return cls(P, geometry.F, geometry.D, geometry.R, pi, trigrams=trigrams, T=T, geometry=geometry, **weights)
+
+    @property
+    def groups(self) -> list[list[int]]:
+        """
+        Key groups of the geometry (home row, other keys, ...), used for swaps and crossover cut points.
+        Without a geometry the report's 3x10 board is assumed.
+        """
+        return (self.geometry if self.geometry is not None else STANDARD).groups
+
+    def trigram_cost(self, permutation: np.ndarray) -> float:
+        if self.trigrams is None:
+            return 0.0
+        n = len(permutation)
+        pos = np.empty_like(permutation)
+        pos[permutation] = np.arange(n)
+        a, b, c = self.abc
+        index = (pos[a] * n + pos[b]) * n + pos[c]
+        return float(self.w4 * self.p3 @ self.T.ravel()[index])
+
+    def cost(self, permutation: np.ndarray) -> float:
+        permutation = np.asarray(permutation).astype(np.intp)
+        c = self.L[np.arange(len(permutation)), permutation].sum()
+        return float(c) + self.trigram_cost(permutation)
+
+    def batch_cost(self, population: np.ndarray, block: int = 256) -> np.ndarray:
+        """
+        Costs of a whole population given as a (pop_size, n_keys) integer array.
+        The trigram term gathers (block, n_trigrams) values at a time to bound memory.
+        """
+        population = np.asarray(population).astype(np.intp)
+        m, n = population.shape
+        costs = self.L[np.arange(n), population].sum(axis=1)
+        if self.trigrams is not None:
+            # int32 keeps the (block, n_trigrams) index arrays small
+            positions = np.empty(population.shape, dtype=np.int32)
+            np.put_along_axis(positions, population, np.arange(n, dtype=np.int32)[None, :], axis=1)
+            a, b, c = self.abc
+            t = self.T.ravel()
+            for i in range(0, m, block):
+                pos = positions[i:i+block]
+                index = (pos[:, a] * n + pos[:, b]) * n + pos[:, c]
+                costs[i:i+block] += self.w4 * (t[index] @ self.p3)
+        return costs
+
+    def swap_delta(self, permutation: np.ndarray, i: int, j: int) -> float:
+        """
+        Cost change of swapping the characters on keys i and j, cost(swapped) - cost(permutation).
+        """
+        return float(self.swap_deltas(permutation, np.array([[i, j]]))[0])
+
+    def swap_deltas(self, permutation: np.ndarray, pairs: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cost changes of many candidate swaps at once, pairs is a (n_pairs, 2) array of keys
+        (all pairs of keys by default, see swap_pairs for restricting them to groups).
+        """
+        permutation = np.asarray(permutation).astype(np.intp)
+        if pairs is None:
+            pairs = swap_pairs([range(len(permutation))])
+        return self.batch_swap_deltas(permutation, pairs)[0]
+
+    def batch_swap_deltas(self, population: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+        """
+        (m, n_pairs) cost changes of the pairs swaps of every layout (row) of population. The bigram and position
+        terms of all layouts are one gather from L, the trigram term is added layout by layout.
+        """
+        population = np.array(population, dtype=np.intp, ndmin=2)
+        i, j = pairs[:, 0], pairs[:, 1]
+        x, y = population[:, i], population[:, j]
+        L = self.L
+        deltas = L[i, y] + L[j, x] - L[i, x] - L[j, y]
+        if self.trigrams is not None:
+            for k, permutation in enumerate(population):
+                deltas[k] += self._trigram_swap_deltas(permutation, i, j)
+        return deltas
+
+    def hill_climb(self, population: np.ndarray, pairs: np.ndarray, budget: Optional[int] = None,
+                   costs: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray, int]:
+        """
+        Steepest descent of every layout (row) of population: each round scores the pairs swaps of all layouts that
+        are not yet at a local optimum together (batch_swap_deltas) and makes the best improving swap of each.
+        With a budget, a round only scores the first layouts whose neighbourhoods still fit in it (the best ones when
+        population is sorted by cost), so the budget is spent on climbing them further. Stops when all layouts are
+        local optima or not even one more neighbourhood fits. A budget smaller than one neighbourhood is an error.
+        costs are the known costs of population. Returns the improved layouts, their costs and the number of scored swaps.
+        """
+        if budget is not None and budget < len(pairs):
+            raise ValueError(f"A budget of {budget} swaps does not cover the {len(pairs)} swaps of one layout")
+        population = np.array(population, dtype=np.intp, ndmin=2)
+        costs = np.array(costs, dtype=float) if costs is not None else self.batch_cost(population)
+        active = np.arange(len(population))
+        used = 0
+        while len(active) > 0:
+            if budget is not None:
+                active = active[:(budget - used) // len(pairs)]
+                if len(active) == 0:
+                    break
+            deltas = self.batch_swap_deltas(population[active], pairs)
+            used += deltas.size
+            move = np.argmin(deltas, axis=1)
+            best = deltas[np.arange(len(active)), move]
+            better = best < -1e-12
+            active, move = active[better], move[better]
+            i, j = pairs[move, 0], pairs[move, 1]
+            population[active, i], population[active, j] = population[active, j], population[active, i]
+            costs[active] += best[better]
+        return population, costs, used
+
+    def _pair_set(self, x: int, y: int, shared: bool) -> np.ndarray:
+        """
+        Indexes of the trigrams that contain character x or y (shared=False), or of the ones that contain
+        both of them or one of them twice (shared=True). Cached per pair of characters.
+        """
+        key = (min(x, y), max(x, y), shared)
+        if key not in self._pair_cache:
+            if shared:
+                both = np.intersect1d(self.containing[x], self.containing[y])
+                self._pair_cache[key] = np.union1d(both, np.union1d(self.repeated[x], self.repeated[y]))
+            else:
+                self._pair_cache[key] = np.union1d(self.containing[x], self.containing[y])
+        return self._pair_cache[key]
+
+    def _single_moves(self, pos: np.ndarray) -> np.ndarray:
+        """
+        C[x, q] = sum of p(t) T[t with x moved to key q] over the trigrams t that contain x exactly once,
+        for the current key positions pos.
+        """
+        T = self.T
+        a, b, c = self.abc
+        pa, pb, pc = pos[a], pos[b], pos[c]
+        Wa, Wb, Wc = self._single_weights
+        return Wa @ T[:, pb, pc].T + Wb @ T[pa, :, pc] + Wc @ T[pa, pb, :]
+
+    def _trigram_swap_deltas(self, permutation: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """
+        Trigram term changes of the swaps (i[k], j[k]) of characters x[k] and y[k].
+        A few swaps are evaluated directly over the trigrams that contain x or y. For many swaps the trigrams
+        containing x (or y) exactly once are read from the _single_moves table, and only the trigrams that
+        contain both characters, or one of them twice, are evaluated directly and corrected for.
+        All direct evaluations are done in one flat pass, segment k holding the trigrams of swap k.
+        """
+        n = len(permutation)
+        x, y = permutation[i], permutation[j]
+        pos = np.empty_like(permutation)
+        pos[permutation] = np.arange(n)
+        use_table = len(i) > SWAP_TABLE_THRESHOLD
+
+        sets = [self._pair_set(a, b, shared=use_table) for a, b in zip(x, y)]
+        segment = np.repeat(np.arange(len(sets)), [len(s) for s in sets])
+        index = np.concatenate(sets) if sets else np.zeros(0, dtype=np.intp)
+        sx, sy, si, sj = x[segment], y[segment], i[segment], j[segment]
+        a, b, c = (v[index] for v in self.abc)
+        t = self.T.ravel()
+
+        def value(move_x: bool, move_y: bool) -> np.ndarray:
+            pa, pb, pc = pos[a], pos[b], pos[c]
+            if move_x:
+                pa, pb, pc = (np.where(v == sx, sj, p) for v, p in ((a, pa), (b, pb), (c, pc)))
+            if move_y:
+                pa, pb, pc = (np.where(v == sy, si, p) for v, p in ((a, pa), (b, pb), (c, pc)))
+            return t[(pa * n + pb) * n + pc]
+
+        before = value(False, False)
+        change = value(True, True) - before
+        if use_table:
+            # remove what the table already counted for these trigrams
+            x_once = (a == sx).astype(int) + (b == sx) + (c == sx) == 1
+            y_once = (a == sy).astype(int) + (b == sy) + (c == sy) == 1
+            change -= np.where(x_once, value(True, False) - before, 0)
+            change -= np.where(y_once, value(False, True) - before, 0)
+        deltas = np.bincount(segment, weights=self.p3[index] * change, minlength=len(sets))
+        if use_table:
+            C = self._single_moves(pos)
+            deltas += C[x, j] - C[x, i] + C[y, i] - C[y, j]
+        return self.w4 * deltas
+
+
+class FitnessCache():
+    """
+    Bounded LRU cache of layout costs, keyed by the permutation as bytes (one byte per key),
+    so optimizers never score the same layout twice. hits and misses count the looked up layouts.
+    """
+    def __init__(self, maxsize: int = CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(permutation: np.ndarray) -> bytes:
+        return np.asarray(permutation).astype(np.uint8).tobytes()
+
+    def store(self, permutation: np.ndarray, cost: float) -> None:
+        key = self.key(permutation)
+        self.entries[key] = float(cost)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def batch_cost(self, model: CostModel, population: np.ndarray) -> np.ndarray:
+        """
+        model.batch_cost(population), only the layouts that are not cached (once each) are scored.
+        """
+        population = np.asarray(population)
+        costs = np.empty(len(population))
+        missing = {} # key -> rows with that layout
+        for k, row in enumerate(population):
+            key = self.key(row)
+            cost = self.entries.get(key)
+            if cost is not None:
+                self.entries.move_to_end(key)
+                costs[k] = cost
+                self.hits += 1
+            elif key in missing:
+                missing[key].append(k)
+                self.hits += 1
+            else:
+                missing[key] = [k]
+                self.misses += 1
+        if missing:
+            rows = [k[0] for k in missing.values()]
+            for k, cost in zip(missing.values(), model.batch_cost(population[rows])):
+                costs[k] = cost
+                self.store(population[k[0]], cost)
+        return costs
+
+    def cost(self, model: CostModel, permutation: np.ndarray) -> float:
+        return float(self.batch_cost(model, np.asarray(permutation)[None, :])[0])
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,110 @@
+import numpy as np
+from typing import Callable, Optional, Sequence
+
+
+def cut_points(m: int, n: int, groups: Sequence[Sequence[int]], rng: np.random.Generator) -> np.ndarray:
+    """
+    (m, 2) array of sorted cut points. The first one is a random key, the second a random key from the
+    same group (e.g. [HOMEROW, OTHER]); keys that are in no group give an empty segment.
+    """
+    group_of = np.full(n, -1)
+    members = np.zeros(shape=(len(groups), max(len(g) for g in groups)), dtype=int)
+    sizes = np.array([len(g) for g in groups])
+    for k, group in enumerate(groups):
+        group_of[list(group)] = k
+        members[k, :len(group)] = group
+    a = rng.integers(0, n, size=m)
+    g = group_of[a]
+    b = members[g, (rng.random(m) * sizes[g]).astype(int)]
+    b = np.where(g < 0, a, b)
+    return np.sort(np.stack([a, b], axis=1), axis=1)
+
+def _segments(cuts: np.ndarray, n: int) -> np.ndarray:
+    """
+    Boolean (m, n) mask of the keys c0 <= i < c1 of every row.
+    """
+    i = np.arange(n)
+    return (i >= cuts[:, :1]) & (i < cuts[:, 1:])
+
+def _inverse(p: np.ndarray) -> np.ndarray:
+    """
+    Row-wise inverse permutations, inverse[r, p[r, i]] = i.
+    """
+    inverse = np.empty_like(p)
+    np.put_along_axis(inverse, p, np.arange(p.shape[1])[None, :], axis=1)
+    return inverse
+
+def pmx(p0: np.ndarray, p1: np.ndarray, cuts: np.ndarray) -> np.ndarray:
+    """
+    Partially mapped crossover (PMX) of every row: the segment comes from p0, the other keys from p1,
+    where characters already in the segment are followed through the p0 -> p1 mapping of the segment.
+    """
+    m, n = p0.shape
+    rows = np.arange(m)[:, None]
+    segment = _segments(cuts, n)
+    # mapping[r, p0[r, k]] = p1[r, k] inside the segment, identity elsewhere
+    mapping = np.tile(np.arange(n), (m, 1))
+    mapping[rows.repeat(n, axis=1)[segment], p0[segment]] = p1[segment]
+    in_segment = np.zeros(shape=(m, n), dtype=bool)
+    in_segment[rows, p0] = segment
+    child = np.where(segment, p0, p1)
+    for _ in range(int(segment.sum(axis=1).max(initial=0))):
+        moved = ~segment & in_segment[rows, child]
+        if not moved.any():
+            break
+        child = np.where(moved, mapping[rows, child], child)
+    return child
+
+def order_crossover(p0: np.ndarray, p1: np.ndarray, cuts: np.ndarray) -> np.ndarray:
+    """
+    Order crossover (OX) of every row: the segment comes from p0, the remaining keys are filled, starting
+    after the segment, with the missing characters in the order they appear in p1 (also starting after the segment).
+    """
+    m, n = p0.shape
+    rows = np.arange(m)[:, None]
+    segment = _segments(cuts, n)
+    in_segment = np.zeros(shape=(m, n), dtype=bool)
+    in_segment[rows, p0] = segment
+    order = (cuts[:, 1:] + np.arange(n)) % n
+    rolled = p1[rows, order]
+    child = np.where(segment, p0, 0)
+    # Both masks select n - len(segment) entries per row, in the same row-major order
+    free = ~segment[rows, order]
+    child[rows.repeat(n, axis=1)[free], order[free]] = rolled[~in_segment[rows, rolled]]
+    return child
+
+def cycle_crossover(p0: np.ndarray, p1: np.ndarray, cuts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cycle crossover (CX) of every row: the keys split into the cycles of p0 -> p1, which are taken
+    alternately from p0 and p1 (the cycle of key 0 from p0). Cut points are not used.
+    """
+    m, n = p0.shape
+    rows = np.arange(m)[:, None]
+    following = _inverse(p0)[rows, p1] # key of p0 that holds the character p1 has on this key
+    # Label every key with the smallest key of its cycle by pointer jumping
+    label = np.tile(np.arange(n), (m, 1))
+    for _ in range(int(np.ceil(np.log2(max(n, 2)))) + 1):
+        label = np.minimum(label, label[rows, following])
+        following = following[rows, following]
+    first = label == np.arange(n)
+    rank = np.cumsum(first, axis=1) - 1
+    return np.where(rank[rows, label] % 2 == 0, p0, p1)
+
+CROSSOVERS: dict[str, Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]] = {
+    "pmx": pmx,
+    "ox": order_crossover,
+    "cycle": cycle_crossover,
+}
+
+def batch_crossover(p0: np.ndarray, p1: np.ndarray, groups: Sequence[Sequence[int]], rng: np.random.Generator,
+                    method: str = "pmx") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Children of all parent pairs (rows of p0 and p1) at once, two per pair with the same cut points:
+    method(p0, p1) and method(p1, p0).
+    """
+    if method not in CROSSOVERS:
+        raise ValueError(f"Unknown crossover {method}, use one of {list(CROSSOVERS)}")
+    p0, p1 = np.asarray(p0, dtype=np.intp), np.asarray(p1, dtype=np.intp)
+    cuts = cut_points(len(p0), p0.shape[1], groups, rng)
+    operator = CROSSOVERS[method]
+    return operator(p0, p1, cuts), operator(p1, p0, cuts)
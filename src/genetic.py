@@ -2,72 +2,129 @@ import random
 import numpy as np
 import matplotlib.pyplot as plt
 from collections import Counter
-from typing import Optional, Tuple
-from text_parser import parse_text
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+from text_parser import as_chunks
+from ngrams import NgramCounter
+from corpus_stats import CorpusStats, bigram_matrix
+from stats_cache import StatsCache
+from cost_model import CostModel, FitnessCache, swap_pairs
+from keyboard import STANDARD
+from crossover import batch_crossover, cut_points, pmx
+from selection import select
+from checkpoint import load_checkpoint, save_checkpoint
+from stagnation import StagnationMonitor, diversity
 import networkx as nx
 from base_layout import full_layout
 from visualization import visualize_keyboard_seaborn
 
 
-HOMEROW = [10, 11, 12, 13, 16, 17, 18, 19]
-OTHER = [ 0,  1,  2,  3,  4,  5,  6,  7,  8,  9,
-                         14, 15,
-         20, 21, 22, 23, 24, 25, 26, 27, 28, 29]
+HOMEROW = STANDARD.homerow
+OTHER = STANDARD.other
+MAX_MUTATION_STRENGTH = 8 # most swaps added to a mutated copy by adaptive mutation
 
 
 class Permutation():
     def __init__(self, permutation: Optional[np.ndarray] = None) -> None:
         if permutation is None:
-            self.permutation = np.random.permutation(30)
+            self.permutation = np.random.permutation(STANDARD.n)
         else:
             self.permutation = permutation
 
     def __str__(self) -> str:
         return str(self.permutation)
 
-    def mutate(self) -> None:
+    def mutate(self, rng: random.Random = random) -> None:
         n = len(self.permutation)
-        a = random.randint(0, n-1)
+        a = rng.randint(0, n-1)
         if a in HOMEROW:
-            b = random.choice(HOMEROW)
+            b = rng.choice(HOMEROW)
         else:
-            b = random.choice(OTHER)
+            b = rng.choice(OTHER)
         c = self.permutation[a]
         self.permutation[a] = self.permutation[b]
         self.permutation[b] = c
 
     @staticmethod
-    def crossover(p0: "Permutation", p1: "Permutation") -> Tuple["Permutation", "Permutation"]:
+    def crossover(p0: "Permutation", p1: "Permutation", rng: random.Random = random) -> Tuple["Permutation", "Permutation"]:
         """
         Partially mapped crossover (PMX)
         """
         n = len(p0.permutation)
-        a = random.randint(0, n-1)
+        a = rng.randint(0, n-1)
         if a in HOMEROW:
-            b = random.choice(HOMEROW)
+            b = rng.choice(HOMEROW)
         else:
-            b = random.choice(OTHER)
-        c = [a, b]
-        c.sort()
+            b = rng.choice(OTHER)
+        cuts = np.array([sorted([a, b])])
+        parents = np.array([p0.permutation, p1.permutation], dtype=int)
+        return Permutation(pmx(parents[:1], parents[1:], cuts)[0]), Permutation(pmx(parents[1:], parents[:1], cuts)[0])
 
-        def pmx(p0: "Permutation", p1: "Permutation", c0: int, c1: int) -> "Permutation":
-            pc = Permutation(permutation=np.zeros(n))
-            pc.permutation[c0:c1] = p0.permutation[c0:c1]
-            for i in np.concatenate([np.arange(0, c0), np.arange(c1, n)]):
-                m = p1.permutation[i]
-                while m in p0.permutation[c0:c1]:
-                    m = p1.permutation[np.where(p0.permutation == m)[0][0]]
-                pc.permutation[i] = m
-            return pc
 
-        return pmx(p0=p0, p1=p1, c0=c[0], c1=c[1]), pmx(p0=p1, p1=p0, c0=c[0], c1=c[1])
+class Population():
+    """
+    Layouts of a whole population as one contiguous (size, n_keys) uint8 array, with their costs
+    (nan for layouts that have not been scored yet). population[i] is a Permutation view of row i,
+    changing it changes the population. Sorting, mutation and crossover work on many rows at once, in place.
+    """
+    def __init__(self, layouts: np.ndarray, costs: Optional[np.ndarray] = None) -> None:
+        self.layouts = np.ascontiguousarray(layouts, dtype=np.uint8)
+        self.costs = np.array(costs, dtype=float) if costs is not None else np.full(len(self.layouts), np.nan)
+
+    @classmethod
+    def random(cls, size: int, n: int, rng: np.random.Generator) -> "Population":
+        return cls(rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1))
+
+    def __len__(self) -> int:
+        return len(self.layouts)
+
+    def __getitem__(self, i: int) -> Permutation:
+        return Permutation(permutation=self.layouts[i])
+
+    def __iter__(self) -> Iterable[Permutation]:
+        return (self[i] for i in range(len(self)))
+
+    def diversity(self) -> float:
+        return diversity(self.layouts)
 
+    def sort(self) -> None:
+        order = np.argsort(self.costs, kind="stable")
+        self.layouts[...] = self.layouts[order]
+        self.costs[...] = self.costs[order]
+
+    def copy_rows(self, rows: np.ndarray, sources: np.ndarray) -> None:
+        self.layouts[rows] = self.layouts[sources]
+        self.costs[rows] = self.costs[sources]
+
+    def mutate(self, rows: np.ndarray, groups: Sequence[Sequence[int]], rng: np.random.Generator) -> None:
+        """
+        Swaps two keys of the same group in every one of the (distinct) rows, like Permutation.mutate.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        i, j = cut_points(len(rows), self.layouts.shape[1], groups, rng).T
+        self.layouts[rows, i], self.layouts[rows, j] = self.layouts[rows, j], self.layouts[rows, i]
+        self.costs[rows] = np.nan
+
+    def crossover(self, rows: np.ndarray, parents: np.ndarray, groups: Sequence[Sequence[int]], rng: np.random.Generator,
+                  method: str = "pmx") -> None:
+        """
+        Replaces rows[2k] and rows[2k+1] with the two children of the parent rows parents[k] (a (len(rows)/2, 2) array).
+        All parents are taken before any row is replaced.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        c0, c1 = batch_crossover(self.layouts[parents[:, 0]], self.layouts[parents[:, 1]], groups, rng, method)
+        self.layouts[rows[0::2]] = c0
+        self.layouts[rows[1::2]] = c1
+        self.costs[rows] = np.nan
 
-def distinct_chars(text: str) -> list[str]:
-    return list(set(text))
 
-def bigram_probability(text: str) -> Tuple[dict[str, float], Counter[str]]:
-    bigrams = Counter([text[i:i+2] for i in range(len(text)-1)])
+def distinct_chars(text: str | Iterable[str]) -> list[str]:
+    chars = set()
+    for chunk in as_chunks(text):
+        chars.update(chunk)
+    return list(chars)
+
+def bigram_probability(text: str | Iterable[str]) -> Tuple[dict[str, float], Counter[str]]:
+    bigrams = NgramCounter().update(text).counter()
     n = sum(bigrams.values())
     return {x: y/n for x, y in bigrams.items()}, bigrams
 
@@ -75,105 +132,276 @@ def p_matrix(chars: list[str], probabilities: dict[str, float]) -> np.ndarray:
     """
     Probability matrix
     """
-    n = len(chars)
-    p = np.zeros(shape=(n, n))
-    for k, v in probabilities.items():
-        p[chars.index(k[0]), chars.index(k[1])] = v
-    return p
+    return bigram_matrix(chars, probabilities).astype(float)
 
 def a_matrix(chars: list[str], bigrams: Counter[str]) -> np.ndarray:
     """
     Stochastic matrix (Markov transition matrix)
     """
-    n = len(chars)
-    a = np.zeros(shape=(n, n))
-    for char in chars:
-        filtered = {k: v for k, v in bigrams.items() if k[0] == char}
-        count = sum(filtered.values())
-        for k, v in filtered.items():
-            a[chars.index(k[0]), chars.index(k[1])] = v/count
-    return a
+    return CorpusStats.from_counter(chars, bigrams).A
 
 def d_matrix() -> np.ndarray:
     """
     Distance matrix
     """
-    d = np.zeros(shape=(30, 30))
-    for y in range(30):
-        for x in range(30):
-            px, py = x%10, x//10
-            qx, qy = y%10, y//10
-            d[y,x] = np.sqrt((px-qx)**2 + (py-qy)**2)
-    return d/np.max(d)
+    return STANDARD.D
 
 def preferred_position_matrix() -> np.ndarray:
     """
     Preferred position matrix
     """
-    return np.diag([2, 3, 4, 5, 1, 1, 5, 4, 3, 2,
-                    6, 7, 8, 9, 2, 2, 9, 8, 7, 6,
-                    2, 3, 4, 5, 1, 1, 5, 4, 3, 2]) / 9
+    return STANDARD.R
 
-def pi_vec(a_matrix: np.ndarray) -> np.ndarray:
+def f_matrix() -> np.ndarray:
     """
-    Stationary probability vector
+    Same finger bigram matrix
     """
-    eig_val, eig_vec = np.linalg.eig(a_matrix.T)
-    pi = eig_vec[:, np.isclose(eig_val, 1, atol=1e-2)]
-    return np.real(pi/sum(pi)).T[0]
+    return STANDARD.F
 
-def pi_matrix(a_matrix: np.ndarray) -> np.ndarray:
+def t_matrix() -> np.ndarray:
     """
-    Pi matrix
+    Trigram matrix, 1 for redirects and -1 for rolls (see KeyboardGeometry.T)
     """
-    return np.diag(pi_vec(a_matrix=a_matrix))
+    return STANDARD.T
 
-def f_matrix() -> np.ndarray:
+class GeneticOptimizer():
     """
-    Same finger bigram matrix
+    Genetic algorithm over key permutations, scored with a CostModel. Nothing is plotted or printed,
+    progress is reported with callback(generation, best_cost, best) every interval generations.
+    Each generation the best elitism fraction of the population is kept, the next mutation_rate fraction
+    are mutated copies of the best ones and the rest are crossover children of parents drawn with
+    selection ("roulette", "tournament" or "rank", see selection.select, with selection_options).
+    crossover is "pmx", "ox" or "cycle" (see crossover.CROSSOVERS). Mutations and cut points stay within the key groups
+    of the model's keyboard geometry (home row and other keys, see CostModel.groups).
+    initial is a starting permutation (or a whole population), otherwise the population is random.
+    With memetic_top > 0 the best memetic_top layouts of every generation are hill climbed over the group
+    swaps (CostModel.hill_climb) with at most memetic_budget scored swaps per generation. Every round scores all group
+    swaps of each layout still improving, when the budget does not cover all of them the best ones keep climbing.
+    memetic_budget must cover at least one layout's group swaps.
+    Costs are looked up in cache (a new FitnessCache by default), so unchanged layouts are not scored again.
+    With checkpoint set, the whole state is saved to that file every checkpoint_interval generations;
+    resume continues such a run exactly as if it had not been interrupted.
+    The run stagnates when the best cost has not improved for patience generations or the diversity of the population
+    (mean pairwise position disagreement) is under min_diversity. Then early_stop ends the run, adaptive_mutation
+    doubles the number of swaps of the mutated copies (back to normal after an improvement) and restart_fraction
+    of the crossover children are replaced with random layouts.
     """
-    f = np.zeros(shape=(30, 30))
-    sfb = [[1, 2, 3, 4, 4, 5, 5, 6, 7, 8],
-           [1, 2, 3, 4, 4, 5, 5, 6, 7, 8],
-           [1, 2, 3, 4, 4, 5, 5, 6, 7, 8]]
-    for y in range(30):
-        for x in range(30):
-            px, py = x%10, x//10
-            qx, qy = y%10, y//10
-            f[y,x] = sfb[py][px] == sfb[qy][qx]
-    return f
-
-def permutation_matrix(p: Permutation) -> np.ndarray:
+    def __init__(self, model: CostModel, population_size: int = 100, elitism: float = .1, mutation_rate: float = .4,
+                 generations: int = 100, seed: Optional[int] = None,
+                 callback: Optional[Callable[[int, float, Permutation], None]] = None, interval: int = 1,
+                 initial: Optional[np.ndarray] = None, crossover: str = "pmx", memetic_top: int = 0,
+                 memetic_budget: int = 2000, cache: Optional[FitnessCache] = None, selection: str = "roulette",
+                 selection_options: Optional[dict] = None, checkpoint: Optional[str] = None,
+                 checkpoint_interval: int = 10, patience: int = 20, min_diversity: float = 0.0, early_stop: bool = False,
+                 adaptive_mutation: bool = False, restart_fraction: float = 0.0) -> None:
+        self.model = model
+        self.population_size = population_size
+        self.elitism = elitism
+        self.mutation_rate = mutation_rate
+        self.generations = generations
+        self.callback = callback
+        self.interval = interval
+        self.crossover = crossover
+        self.selection = selection
+        self.selection_options = selection_options or {}
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.monitor = StagnationMonitor(patience=patience, min_diversity=min_diversity)
+        self.early_stop = early_stop
+        self.adaptive_mutation = adaptive_mutation
+        self.restart_fraction = restart_fraction
+        self.mutation_strength = 1
+        self.stopped = False
+        self.memetic_top = memetic_top
+        self.memetic_budget = memetic_budget
+        self.groups = model.groups
+        self.pairs = swap_pairs(self.groups)
+        if memetic_top > 0 and memetic_budget < len(self.pairs):
+            raise ValueError(f"memetic_budget {memetic_budget} does not cover the {len(self.pairs)} group swaps of one layout")
+        self.cache = cache if cache is not None else FitnessCache()
+        self.rng = np.random.default_rng(seed)
+        self.generation = 0
+        self.history = [] # best cost of every generation
+        self.diversity = [] # population diversity of every generation
+        n = len(model.pi)
+        if initial is None:
+            self.population = Population.random(population_size, n, self.rng)
+        else:
+            initial = np.asarray(initial)
+            self.population = Population(np.tile(initial, (population_size, 1)) if initial.ndim == 1 else initial)
+        self.evaluate()
+
+    @property
+    def costs(self) -> np.ndarray:
+        return self.population.costs
+
+    def evaluate(self) -> None:
+        """
+        Scores the layouts of the population that have no cost yet.
+        """
+        stale = np.isnan(self.population.costs)
+        if stale.any():
+            self.population.costs[stale] = self.cache.batch_cost(self.model, self.population.layouts[stale])
+
+    def step(self) -> None:
+        """
+        Sorts the population and replaces everything but the elite with a new generation.
+        """
+        population = self.population
+        population.sort()
+        costs = population.costs
+        self.history.append(float(costs[0]))
+        self.diversity.append(population.diversity())
+        if self.callback is not None and self.generation % self.interval == 0:
+            self.callback(self.generation, float(costs[0]), population[0])
+        stagnating = self.monitor.update(self.history[-1], self.diversity[-1])
+        if self.monitor.improved:
+            self.mutation_strength = 1
+        if stagnating:
+            if self.early_stop:
+                self.stopped = True
+                return
+            if self.adaptive_mutation:
+                self.mutation_strength = min(2 * self.mutation_strength, MAX_MUTATION_STRENGTH)
+
+        elite = int(self.elitism * self.population_size)
+        mutated = elite + int(self.mutation_rate * self.population_size)
+        # Cross, the parents come from the sorted population before any row is replaced
+        pairs = len(range(mutated, self.population_size-1, 2))
+        if pairs > 0:
+            parents = select(costs, 2*pairs, self.rng, self.selection, **self.selection_options).reshape(-1, 2)
+            population.crossover(np.arange(mutated, mutated + 2*pairs), parents, self.groups, self.rng, self.crossover)
+        # Mutate copies of the elite, the k-th block of elite rows after it is mutated k times
+        rows = np.arange(elite, mutated)
+        e = max(elite, 1)
+        population.copy_rows(rows, (rows - elite) % e)
+        rounds = ((rows - elite) // e + 1) * self.mutation_strength
+        for r in range(rounds.max(initial=0)):
+            population.mutate(rows[rounds > r], self.groups, self.rng)
+        # Partial restart with random layouts in place of the last children
+        if stagnating and self.restart_fraction > 0:
+            fresh = np.arange(self.population_size - int(self.restart_fraction * pairs * 2), self.population_size)
+            fresh = fresh[fresh >= mutated]
+            n = population.layouts.shape[1]
+            population.layouts[fresh] = self.rng.permuted(np.tile(np.arange(n), (len(fresh), 1)), axis=1)
+            population.costs[fresh] = np.nan
+        self.evaluate()
+        if self.memetic_top > 0:
+            self.refine()
+        self.generation += 1
+
+    def refine(self) -> None:
+        """
+        Memetic step, replaces the best memetic_top layouts with their hill climbed versions.
+        """
+        population = self.population
+        top = np.argsort(population.costs, kind="stable")[:self.memetic_top]
+        layouts, costs, _ = self.model.hill_climb(population.layouts[top], self.pairs, self.memetic_budget, population.costs[top])
+        population.layouts[top] = layouts
+        population.costs[top] = costs
+        for layout, cost in zip(layouts, costs):
+            self.cache.store(layout, cost)
+
+    def get_state(self) -> dict:
+        """
+        Everything needed to continue the run elsewhere: population, costs, generation, history, the RNG state
+        and the stagnation state.
+        """
+        return {"population": np.copy(self.population.layouts), "costs": np.copy(self.population.costs),
+                "generation": self.generation, "history": list(self.history), "diversity": list(self.diversity),
+                "rng": self.rng.bit_generator.state, "monitor": self.monitor.get_state(),
+                "mutation_strength": self.mutation_strength, "stopped": self.stopped}
+
+    def set_state(self, state: dict) -> None:
+        self.population = Population(state["population"], state["costs"])
+        self.generation = state["generation"]
+        self.history = list(state["history"])
+        self.diversity = list(state["diversity"])
+        self.rng.bit_generator.state = state["rng"]
+        self.monitor.set_state(state["monitor"])
+        self.mutation_strength = state["mutation_strength"]
+        self.stopped = state["stopped"]
+
+    def save_checkpoint(self, path: str) -> None:
+        """
+        Saves the state with the fitness cache (whose entries decide which layouts are scored together,
+        and so the last bits of their costs) and the state of the random module.
+        """
+        state = self.get_state()
+        keys = list(self.cache.entries)
+        arrays = {"population": state["population"], "costs": state["costs"], "history": np.array(state["history"]),
+                  "diversity": np.array(state["diversity"]),
+                  "cache_layouts": np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), self.population.layouts.shape[1]),
+                  "cache_costs": np.array(list(self.cache.entries.values()))}
+        meta = {key: state[key] for key in ("generation", "rng", "monitor", "mutation_strength", "stopped")}
+        meta.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        save_checkpoint(path, arrays, meta)
+
+    def load_checkpoint(self, path: str) -> None:
+        arrays, meta = load_checkpoint(path)
+        if arrays["population"].shape != self.population.layouts.shape:
+            raise ValueError(f"Checkpoint {path} has a population of shape {arrays['population'].shape}, "
+                             f"expected {self.population.layouts.shape}")
+        self.set_state(dict(meta, population=arrays["population"], costs=arrays["costs"], history=arrays["history"].tolist(),
+                            diversity=arrays["diversity"].tolist()))
+        self.cache.clear()
+        for layout, cost in zip(arrays["cache_layouts"], arrays["cache_costs"]):
+            self.cache.store(layout, cost)
+        self.cache.hits, self.cache.misses = meta["cache_hits"], meta["cache_misses"]
+
+    @classmethod
+    def resume(cls, model: CostModel, path: str, **config) -> "GeneticOptimizer":
+        """
+        Optimizer with config (as in the interrupted run) continuing from the checkpoint at path.
+        """
+        optimizer = cls(model, checkpoint=config.pop("checkpoint", path), **config)
+        optimizer.load_checkpoint(path)
+        return optimizer
+
+    def best(self) -> Tuple[Permutation, float]:
+        i = int(np.argmin(self.population.costs))
+        return Permutation(permutation=np.copy(self.population.layouts[i])), float(self.population.costs[i])
+
+    def run(self, generations: Optional[int] = None) -> Tuple[Permutation, float]:
+        """
+        Runs generations more generations (by default until the configured number of generations is reached,
+        or until early_stop ends the run) and returns the best layout and its cost.
+        """
+        for _ in range(self.generations - self.generation if generations is None else generations):
+            if self.stopped:
+                break
+            self.step()
+            if self.checkpoint is not None and self.generation % self.checkpoint_interval == 0:
+                self.save_checkpoint(self.checkpoint)
+        return self.best()
+
+
+class CostPlot():
     """
-    Permutation matrix
+    Progress observer for GeneticOptimizer that plots the best cost of every reported generation.
     """
-    n = len(p.permutation)
-    e = np.zeros(shape=(n, n))
-    for i, idx in enumerate(p.permutation):
-        e[int(idx),i] = 1
-    return e
+    def __init__(self, pause: float = .005) -> None:
+        self.pause = pause
+        self.costs = []
+
+    def __call__(self, generation: int, cost: float, best: Permutation) -> None:
+        self.costs.append(cost)
+        plt.plot(self.costs, c="black")
+        plt.pause(self.pause)
+
+    def show(self) -> None:
+        plt.show()
+
 
 if __name__ == "__main__":
-    text = parse_text("./data/war_and_peace_by_tolstoy.txt")
-    dc = distinct_chars(text=text)
-    dc.sort()
-    bp, bs = bigram_probability(text=text)
-    a = a_matrix(chars=dc, bigrams=bs)
-
-    P = p_matrix(chars=dc, probabilities=bp)
-    PI = pi_matrix(a_matrix=a)
-    pi = pi_vec(a_matrix=a)
-    D = d_matrix()
-    R = preferred_position_matrix()
-    F = f_matrix()
-
-    def cost(p: Permutation) -> float:
-        w1 = 0.6 # Same finger bigram weight
-        w2 = 0.3 # Distance weight
-        w3 = 1.0 # Preferred position weight
-        E = permutation_matrix(p=p)
-        s = pi[p.permutation.astype(int)]
-        return np.sum(E@P*(w1*F + w2*D) - w3*np.diag(s)*R).astype(float)
+    corpus = "./data/war_and_peace_by_tolstoy.txt"
+    stats = StatsCache().get(corpus, trigrams=True)
+    dc = stats.chars
+
+    P = stats.P
+    PI = stats.PI
+    pi = stats.pi
+    model = CostModel.from_geometry(STANDARD, P, pi, trigrams=stats.trigrams, w1=0.6, w2=0.3, w3=1.0, w4=0.5)
 
     network_layout = ["m", "g", "h", ":", ",", "q", "f", "s", "w", "b",
                       "n", "i", "r", "e", ".", "x", "a", "o", "u", "t",
@@ -183,50 +411,18 @@ if __name__ == "__main__":
     network_layout = full_layout(G, "Degree", dc, pi) # this metric parameter should be variable
     print(network_layout)
 
-    starting_permutation = np.zeros(30)
+    starting_permutation = np.zeros(30, dtype=int)
     for i in range(len(network_layout)):
         starting_permutation[i] = dc.index(network_layout[i])
 
-    population_size = 100
-    keep_top = .1
-    only_mutate = .5
-    mutation_rate = .5
-    plot_costs = []
-    population = np.array([Permutation(permutation=starting_permutation) for _ in range(population_size)])
-    for x in range(100):
-        costs = np.array([cost(p) for p in population])
-        # Sort
-        sort = np.argsort(costs)
-        population = population[sort]
-        costs = costs[sort]
-        # Selection probabilities
-        probabilities = costs[-1] - costs
-        probabilities /= sum(probabilities) + 1e-8
-        # Plot
-        plot_costs.append(cost(population[0]))
-        plt.plot(plot_costs, c="black")
-        plt.pause(.005)
-        # Cross and mutate
-        for i in range(int(keep_top*population_size), int(only_mutate*population_size)):
-            population[i] = Permutation(np.copy(population[i-10].permutation))
-            population[i].mutate()
-        for i in range(int(only_mutate*population_size)+int(keep_top*population_size), population_size-1, 2):
-            def sample() -> Permutation:
-                r = random.random()
-                j = 0
-                while r > 0:
-                    if j == population_size:
-                        break
-                    r -= probabilities[j]
-                    j += 1
-                return population[j-1]
-            population[i], population[i+1] = Permutation.crossover(sample(), sample())
-    plt.show()
+    plot = CostPlot()
+    optimizer = GeneticOptimizer(model, population_size=100, elitism=.1, mutation_rate=.4, generations=100,
+                                 callback=plot, initial=starting_permutation)
+    best, best_cost = optimizer.run()
+    plot.show()
 
-    print(f"\nFinal cost: {plot_costs[-1]}")
-    sort = np.argsort(np.array([cost(p) for p in population]))
-    population = population[sort]
-    permutation = population[0].permutation
+    print(f"\nFinal cost: {best_cost}")
+    permutation = best.permutation
 
     res = np.array(dc)[permutation.astype(int)]
     print()
@@ -237,7 +433,6 @@ if __name__ == "__main__":
     visualize_keyboard_seaborn(np.array([res[:10], res[10:20], res[20:]]))
 
     """
-    E = permutation_matrix(p=Permutation())
     fig, ax = plt.subplots(nrows=3, ncols=2)
     ax[0,0].imshow(P)
     # ax[0,0].imshow(-np.log(P, where=P>0))
@@ -250,8 +445,6 @@ if __name__ == "__main__":
     ax[1,1].set_title("R")
     ax[2,0].imshow(F)
     ax[2,0].set_title("F")
-    ax[2,1].imshow(E)
-    ax[2,1].set_title("E")
     plt.show()
 
     plt.imsave("p.pdf", P)
@@ -259,5 +452,4 @@ if __name__ == "__main__":
     plt.imsave("d.pdf", D)
     plt.imsave("r.pdf", R)
     plt.imsave("f.pdf", F)
-    plt.imsave("e.pdf", E)
     """
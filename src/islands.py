@@ -0,0 +1,122 @@
+import os
+import numpy as np
+from typing import Callable, Iterable, Optional, Sequence
+from cost_model import CostModel, FitnessCache
+from genetic import GeneticOptimizer, Permutation
+from shared_model import model_pool, worker_cache, worker_model
+
+
+def _evolve(model: CostModel, cache: FitnessCache, task: tuple) -> tuple[dict, int, int]:
+    """
+    Restores an island from its state, runs it for some generations and returns the new state
+    with the number of cache hits and misses.
+    """
+    config, state, generations = task
+    for population, costs in zip(state["population"], state["costs"]):
+        cache.store(population, costs)
+    optimizer = GeneticOptimizer(model, initial=state["population"], cache=cache, **config)
+    optimizer.set_state(state)
+    hits, misses = cache.hits, cache.misses
+    optimizer.run(generations)
+    return optimizer.get_state(), cache.hits - hits, cache.misses - misses
+
+def _evolve_in_worker(task: tuple) -> tuple[dict, int, int]:
+    return _evolve(worker_model(), worker_cache(), task)
+
+def migration_edges(topology: str | Sequence[tuple[int, int]], islands: int) -> list[tuple[int, int]]:
+    """
+    (source, target) island pairs. topology is "ring" (every island sends to the next one),
+    "complete" (every island sends to all others) or an explicit list of pairs.
+    """
+    if topology == "ring":
+        return [(k, (k+1) % islands) for k in range(islands)] if islands > 1 else []
+    if topology == "complete":
+        return [(k, l) for k in range(islands) for l in range(islands) if k != l]
+    if isinstance(topology, str):
+        raise ValueError(f"Unknown migration topology {topology}")
+    return [(int(k), int(l)) for k, l in topology]
+
+
+class IslandOptimizer():
+    """
+    Island model genetic algorithm: independent GeneticOptimizer populations evolve in a process pool,
+    and every interval generations each island sends copies of its best migrants layouts to its neighbours
+    in the migration topology, where they replace the worst layouts.
+    The cost model matrices are shared with the workers through shared memory.
+    callback(generation, best_cost, best) is called after every migration.
+    hits and misses sum the fitness cache counters of all islands.
+    """
+    def __init__(self, model: CostModel, islands: int = 4, interval: int = 10, migrants: int = 2,
+                 topology: str | Sequence[tuple[int, int]] = "ring", generations: int = 100,
+                 processes: Optional[int] = None, seed: Optional[int] = None,
+                 callback: Optional[Callable[[int, float, Permutation], None]] = None,
+                 initial: Optional[np.ndarray] = None, **config) -> None:
+        self.model = model
+        self.islands = islands
+        self.interval = interval
+        self.migrants = migrants
+        self.edges = migration_edges(topology, islands)
+        self.generations = generations
+        self.processes = processes
+        self.callback = callback
+        self.config = config # population_size, elitism, mutation_rate, ... of every island
+        seeds = np.random.SeedSequence(seed).spawn(islands)
+        self.states = []
+        for k in range(islands):
+            island_seed = int(seeds[k].generate_state(1)[0])
+            optimizer = GeneticOptimizer(model, seed=island_seed, initial=initial, **config)
+            self.states.append(optimizer.get_state())
+        self.generation = 0
+        self.history = [] # best cost over all islands after every migration
+        self.hits = 0
+        self.misses = 0
+
+    def migrate(self) -> None:
+        """
+        Copies the best layouts of every source island over the worst ones of its targets.
+        Migrants are taken before any island is changed, so the order of the edges does not matter.
+        """
+        best = []
+        for state in self.states:
+            order = np.argsort(state["costs"], kind="stable")[:self.migrants]
+            best.append((state["population"][order], state["costs"][order]))
+        for source, target in self.edges:
+            state = self.states[target]
+            population, costs = best[source]
+            worst = np.argsort(state["costs"], kind="stable")[::-1][:len(costs)]
+            state["population"][worst] = population
+            state["costs"][worst] = costs
+
+    def best(self) -> tuple[Permutation, float]:
+        k = int(np.argmin([state["costs"].min() for state in self.states]))
+        i = int(np.argmin(self.states[k]["costs"]))
+        return Permutation(permutation=np.copy(self.states[k]["population"][i])), float(self.states[k]["costs"][i])
+
+    def _epochs(self, evolve: Callable[[list[tuple]], Iterable[tuple[dict, int, int]]]) -> None:
+        while self.generation < self.generations:
+            generations = min(self.interval, self.generations - self.generation)
+            tasks = [(self.config, state, generations) for state in self.states]
+            results = list(evolve(tasks))
+            self.states = [state for state, _, _ in results]
+            self.hits += sum(hits for _, hits, _ in results)
+            self.misses += sum(misses for _, _, misses in results)
+            self.generation += generations
+            self.migrate()
+            best, cost = self.best()
+            self.history.append(cost)
+            if self.callback is not None:
+                self.callback(self.generation, cost, best)
+
+    def run(self) -> tuple[Permutation, float]:
+        """
+        Evolves all islands for the configured number of generations, returns the best layout and its cost.
+        With processes=1 the islands are evolved one after another in this process.
+        """
+        if self.processes == 1 or self.islands == 1:
+            cache = FitnessCache()
+            self._epochs(lambda tasks: (_evolve(self.model, cache, task) for task in tasks))
+            return self.best()
+        processes = min(self.processes or os.cpu_count() or 1, self.islands)
+        with model_pool(self.model, processes) as pool:
+            self._epochs(lambda tasks: pool.map(_evolve_in_worker, tasks))
+        return self.best()
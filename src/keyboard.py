@@ -0,0 +1,123 @@
+import numpy as np
+from functools import cached_property
+from typing import Sequence
+
+FINGERS_ROW = [1, 2, 3, 4, 4, 5, 5, 6, 7, 8] # left little to index, right index to little finger
+WEIGHTS_3X10 = [2, 3, 4, 5, 1, 1, 5, 4, 3, 2,
+                6, 7, 8, 9, 2, 2, 9, 8, 7, 6,
+                2, 3, 4, 5, 1, 1, 5, 4, 3, 2]
+LEFT_THUMB, RIGHT_THUMB = 0, 9
+
+
+def grid_coordinates(rows: int, columns: int) -> np.ndarray:
+    """
+    (rows * columns, 2) array of the (x, y) coordinates of an ortholinear grid, row by row.
+    """
+    y, x = np.divmod(np.arange(rows * columns), columns)
+    return np.stack([x, y], axis=1).astype(float)
+
+
+class KeyboardGeometry():
+    """
+    Keyboard description: coordinates (x, y) of every key in key widths, the finger that presses it
+    (0 left thumb, 1-4 left little to index finger, 5-8 right index to little finger, 9 right thumb),
+    its preference weight and the home row keys. Keys on fingers > 4 are typed with the right hand.
+    The cost model matrices are computed with broadcasting once per geometry.
+    """
+    def __init__(self, coordinates: np.ndarray, fingers: Sequence[int], weights: Sequence[float], homerow: Sequence[int],
+                 thumbs: Sequence[int] = (), name: str = "") -> None:
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        self.fingers = np.asarray(fingers, dtype=int)
+        self.weights = np.asarray(weights, dtype=float)
+        self.homerow = list(homerow)
+        self.thumbs = list(thumbs)
+        self.name = name
+        if not len(self.coordinates) == len(self.fingers) == len(self.weights):
+            raise ValueError("coordinates, fingers and weights need one entry per key")
+
+    def __repr__(self) -> str:
+        return f"KeyboardGeometry({self.name or self.n})"
+
+    @property
+    def n(self) -> int:
+        return len(self.coordinates)
+
+    @property
+    def other(self) -> list[int]:
+        """
+        Keys that are neither on the home row nor thumb keys.
+        """
+        special = set(self.homerow) | set(self.thumbs)
+        return [k for k in range(self.n) if k not in special]
+
+    @property
+    def groups(self) -> list[list[int]]:
+        """
+        Key groups whose characters swaps and crossover cut points stay within: home row, other keys and thumb keys.
+        """
+        return [g for g in (self.homerow, self.other, self.thumbs) if len(g) > 0]
+
+    @property
+    def hands(self) -> np.ndarray:
+        """
+        True for the keys typed with the right hand.
+        """
+        return self.fingers > 4
+
+    @cached_property
+    def D(self) -> np.ndarray:
+        """
+        Distance matrix, euclidean distances between keys divided by the largest one
+        """
+        c = self.coordinates
+        d = np.sqrt(((c[:, None, :] - c[None, :, :])**2).sum(axis=2))
+        return d / np.max(d)
+
+    @cached_property
+    def F(self) -> np.ndarray:
+        """
+        Same finger bigram matrix
+        """
+        return (self.fingers[:, None] == self.fingers[None, :]).astype(float)
+
+    @cached_property
+    def R(self) -> np.ndarray:
+        """
+        Preferred position matrix, key weights divided by the largest one on the diagonal
+        """
+        return np.diag(self.weights / np.max(self.weights))
+
+    @cached_property
+    def T(self) -> np.ndarray:
+        """
+        Trigram matrix, 1 for redirects (three keys on one hand where the fingers change direction)
+        and -1 for rolls (three keys on one hand where the fingers move in one direction)
+        """
+        f, hand = self.fingers, self.hands
+        one_hand = (hand[:, None, None] == hand[None, :, None]) & (hand[None, :, None] == hand[None, None, :])
+        d1 = np.sign(f[None, :, None] - f[:, None, None])
+        d2 = np.sign(f[None, None, :] - f[None, :, None])
+        moving = one_hand & (d1 != 0) & (d2 != 0)
+        return np.where(moving, np.where(d1 == d2, -1.0, 1.0), 0.0)
+
+
+def standard_geometry() -> KeyboardGeometry:
+    """
+    The 3x10 ortholinear board used in the report.
+    """
+    return KeyboardGeometry(grid_coordinates(3, 10), np.tile(FINGERS_ROW, 3), WEIGHTS_3X10,
+                            homerow=[10, 11, 12, 13, 16, 17, 18, 19], name="3x10")
+
+def split_34_geometry(thumb_weight: float = 1) -> KeyboardGeometry:
+    """
+    The 34 key board from the README: the 3x10 grid and two thumb keys per hand under the index fingers.
+    Thumb keys are a group of their own, they usually hold the empty characters (space, shift, ...).
+    """
+    thumbs = np.array([[3, 3], [4, 3], [5, 3], [6, 3]], dtype=float)
+    return KeyboardGeometry(np.concatenate([grid_coordinates(3, 10), thumbs]),
+                            np.concatenate([np.tile(FINGERS_ROW, 3), [LEFT_THUMB, LEFT_THUMB, RIGHT_THUMB, RIGHT_THUMB]]),
+                            WEIGHTS_3X10 + [thumb_weight] * 4, homerow=[10, 11, 12, 13, 16, 17, 18, 19],
+                            thumbs=[30, 31, 32, 33], name="34 keys")
+
+STANDARD = standard_geometry()
+SPLIT_34 = split_34_geometry()
@@ -0,0 +1,170 @@
+import os
+import numpy as np
+from typing import Callable, Optional, Sequence
+from cost_model import CostModel, FitnessCache, swap_pairs
+from genetic import Permutation
+from shared_model import model_pool, worker_cache, worker_model
+
+MAX_BLOCK = 64 # most annealing proposals scored with one swap_deltas call
+
+
+def exponential_cooling(k: np.ndarray, iterations: int, t0: float, t_end: float) -> np.ndarray:
+    return t0 * (t_end / t0) ** (k / iterations)
+
+def linear_cooling(k: np.ndarray, iterations: int, t0: float, t_end: float) -> np.ndarray:
+    return t0 + (t_end - t0) * k / iterations
+
+def logarithmic_cooling(k: np.ndarray, iterations: int, t0: float, t_end: float) -> np.ndarray:
+    """
+    t0 / (1 + a log(1 + k)), with a chosen so the last iteration is at t_end
+    """
+    a = (t0 / t_end - 1) / np.log(1 + iterations)
+    return t0 / (1 + a * np.log(1 + k))
+
+SCHEDULES = {
+    "exponential": exponential_cooling,
+    "linear": linear_cooling,
+    "logarithmic": logarithmic_cooling,
+}
+
+
+class LocalSearch():
+    """
+    Single trajectory search over key swaps within groups (by default CostModel.groups), scored with
+    CostModel.swap_deltas. initial is the starting permutation, otherwise a random one is used.
+    Swaps never move a character to another group, so the home row characters are the ones of the starting
+    layout (e.g. from base_layout.full_layout). Whole layouts are scored through cache.
+    """
+    def __init__(self, model: CostModel, iterations: int = 1000, groups: Optional[Sequence[Sequence[int]]] = None,
+                 seed: Optional[int] = None, initial: Optional[np.ndarray] = None, cache: Optional[FitnessCache] = None) -> None:
+        self.model = model
+        self.cache = cache if cache is not None else FitnessCache()
+        self.iterations = iterations
+        self.pairs = swap_pairs(groups if groups is not None else model.groups)
+        self.rng = np.random.default_rng(seed)
+        n = len(model.pi)
+        self.permutation = np.array(initial, dtype=np.intp) if initial is not None else self.rng.permutation(n)
+        self.cost = self.cache.cost(model, self.permutation)
+        self.best_permutation = np.copy(self.permutation)
+        self.best_cost = self.cost
+        self.evaluations = 0 # number of scored swaps
+        self.history = [] # current cost after every accepted move
+
+    def swap(self, pair: int, delta: float) -> None:
+        i, j = self.pairs[pair]
+        self.permutation[[i, j]] = self.permutation[[j, i]]
+        self.cost += delta
+        self.history.append(self.cost)
+        if self.cost < self.best_cost:
+            self.best_cost = self.cost
+            self.best_permutation = np.copy(self.permutation)
+
+    def result(self) -> tuple[Permutation, float]:
+        # recompute the cost, so rounding errors of the summed deltas do not accumulate
+        return Permutation(permutation=np.copy(self.best_permutation)), self.cache.cost(self.model, self.best_permutation)
+
+
+class SimulatedAnnealing(LocalSearch):
+    """
+    Simulated annealing with a random swap per iteration, accepted with probability min(1, exp(-delta / t)).
+    schedule is "exponential", "linear", "logarithmic" or a function (k, iterations, t0, t_end) -> temperature.
+    By default t0 accepts an average uphill swap of the starting layout with probability 0.8 and t_end = t0 / 1000.
+    Proposals are scored in blocks; the ones after the first accepted proposal of a block are discarded,
+    so the result is the same as scoring them one by one. evaluations counts the discarded proposals too.
+    """
+    def __init__(self, model: CostModel, iterations: int = 20000, schedule: str | Callable = "exponential",
+                 t0: Optional[float] = None, t_end: Optional[float] = None, **kwargs) -> None:
+        super().__init__(model, iterations, **kwargs)
+        if isinstance(schedule, str):
+            if schedule not in SCHEDULES:
+                raise ValueError(f"Unknown cooling schedule {schedule}, use one of {list(SCHEDULES)}")
+            schedule = SCHEDULES[schedule]
+        self.schedule = schedule
+        if t0 is None:
+            deltas = model.swap_deltas(self.permutation, self.pairs)
+            self.evaluations += len(deltas)
+            uphill = deltas[deltas > 0]
+            t0 = -uphill.mean() / np.log(0.8) if len(uphill) > 0 else 1.0
+        self.t0 = t0
+        self.t_end = t_end if t_end is not None else t0 / 1000
+
+    def run(self) -> tuple[Permutation, float]:
+        k, block = 0, 1
+        while k < self.iterations:
+            size = min(block, self.iterations - k)
+            proposals = self.rng.integers(len(self.pairs), size=size)
+            deltas = self.model.swap_deltas(self.permutation, self.pairs[proposals])
+            self.evaluations += size # every proposal of the block is scored, also the discarded ones
+            temperatures = self.schedule(k + np.arange(size), self.iterations, self.t0, self.t_end)
+            with np.errstate(over="ignore"):
+                accept = (deltas <= 0) | (self.rng.random(size) < np.exp(-deltas / temperatures))
+            if accept.any():
+                first = int(np.argmax(accept))
+                self.swap(proposals[first], deltas[first])
+                k += first + 1
+                block = min(2 * (first + 1), MAX_BLOCK)
+            else:
+                k += size
+                block = min(2 * block, MAX_BLOCK)
+        return self.result()
+
+
+class TabuSearch(LocalSearch):
+    """
+    Tabu search over the whole swap neighbourhood: every iteration the best swap that is not tabu is made,
+    even if it makes the layout worse, and swapping the same two keys is then tabu for tenure iterations
+    (unless it would give a new best layout). Stops early after patience iterations without a new best.
+    """
+    def __init__(self, model: CostModel, iterations: int = 1000, tenure: int = 20, patience: Optional[int] = None,
+                 **kwargs) -> None:
+        super().__init__(model, iterations, **kwargs)
+        self.tenure = tenure
+        self.patience = patience
+
+    def run(self) -> tuple[Permutation, float]:
+        tabu_until = np.zeros(len(self.pairs), dtype=int)
+        last_improvement = 0
+        for k in range(self.iterations):
+            deltas = self.model.swap_deltas(self.permutation, self.pairs)
+            self.evaluations += len(deltas)
+            allowed = (tabu_until <= k) | (self.cost + deltas < self.best_cost)
+            if not allowed.any():
+                continue
+            move = int(np.argmin(np.where(allowed, deltas, np.inf)))
+            best_cost = self.best_cost
+            self.swap(move, deltas[move])
+            tabu_until[move] = k + 1 + self.tenure
+            if self.best_cost < best_cost:
+                last_improvement = k
+            elif self.patience is not None and k - last_improvement >= self.patience:
+                break
+        return self.result()
+
+
+def _search(model: CostModel, cache: FitnessCache, task: tuple) -> tuple[np.ndarray, float, int]:
+    engine, seed, config = task
+    search = engine(model, seed=seed, cache=cache, **config)
+    best, cost = search.run()
+    return best.permutation, cost, search.evaluations
+
+def _search_in_worker(task: tuple) -> tuple[np.ndarray, float, int]:
+    return _search(worker_model(), worker_cache(), task)
+
+def parallel_restarts(engine: type, model: CostModel, restarts: int = 4, processes: Optional[int] = None,
+                      seed: Optional[int] = None, **config) -> tuple[Permutation, float, list[float], int]:
+    """
+    Runs restarts independent searches of engine (SimulatedAnnealing or TabuSearch) with config in a process pool
+    sharing the cost model (processes=1 runs them in this process).
+    Returns the best layout, its cost, the costs of all restarts and the total number of scored swaps.
+    """
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(restarts)]
+    tasks = [(engine, s, config) for s in seeds]
+    if processes == 1 or restarts == 1:
+        cache = FitnessCache()
+        results = [_search(model, cache, task) for task in tasks]
+    else:
+        with model_pool(model, min(processes or os.cpu_count() or 1, restarts)) as pool:
+            results = list(pool.map(_search_in_worker, tasks))
+    costs = [cost for _, cost, _ in results]
+    best = int(np.argmin(costs))
+    return Permutation(permutation=results[best][0]), costs[best], costs, sum(e for _, _, e in results)
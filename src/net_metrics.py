@@ -1,7 +1,153 @@
+import hashlib
 import networkx as nx
-from typing import Literal
+import numpy as np
+from typing import Callable, Literal
 import pandas as pd
 
+METRICS = ["Degree", "Eigenvector", "Betweenness", "Closeness", "PageRank"]
+
+
+def adjacency(G : nx.DiGraph) -> np.ndarray:
+    """
+    Weight matrix of the graph in node order, nan where there is no edge.
+    """
+    return nx.to_numpy_array(G, nodelist=list(G), weight="weight", nonedge=np.nan)
+
+def fingerprint(A : np.ndarray) -> str:
+    """
+    Hash of an adjacency matrix, the cache key of its centralities.
+    """
+    return hashlib.blake2b(np.ascontiguousarray(A).tobytes() + str(A.shape).encode(), digest_size=16).hexdigest()
+
+def lengths(A : np.ndarray) -> np.ndarray:
+    """
+    Edge lengths 1 - w for the path based metrics (heavier edges are shorter), inf where there is no edge.
+    """
+    return np.where(np.isnan(A), np.inf, 1 - A)
+
+def shortest_paths(L : np.ndarray) -> np.ndarray:
+    """
+    All pairs shortest path lengths (Floyd-Warshall, one broadcast per intermediate node), inf if unreachable.
+    """
+    D = L.copy()
+    np.fill_diagonal(D, 0)
+    for k in range(len(D)):
+        np.minimum(D, D[:, k, None] + D[None, k, :], out=D)
+    return D
+
+def degree_centrality(A : np.ndarray) -> np.ndarray:
+    """
+    Weighted degree, in plus out edges.
+    """
+    W = np.nan_to_num(A)
+    return W.sum(axis=0) + W.sum(axis=1)
+
+def eigenvector_centrality(A : np.ndarray) -> np.ndarray:
+    """
+    Principal eigenvector of the transposed weight matrix (in edges), with unit length and a positive sum.
+    """
+    values, vectors = np.linalg.eig(np.nan_to_num(A).T)
+    largest = vectors[:, np.argmax(values.real)].real
+    return largest / (np.sign(largest.sum()) * np.linalg.norm(largest))
+
+def pagerank_centrality(A : np.ndarray, alpha: float = 0.85, tol: float = 1e-6, max_iter: int = 100) -> np.ndarray:
+    """
+    PageRank by power iteration, on the edge lengths 1 - w like the path based metrics.
+    Dangling nodes jump uniformly.
+    """
+    W = np.where(np.isnan(A), 0, 1 - A)
+    n = len(W)
+    out = W.sum(axis=1)
+    dangling = out == 0
+    M = W / np.where(dangling, 1, out)[:, None]
+    x = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        last = x
+        x = alpha * (x @ M + x[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(x - last).sum() < n * tol:
+            return x
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+def closeness_from_lengths(L : np.ndarray) -> np.ndarray:
+    """
+    1 / (sum of the shortest path lengths to every reachable node).
+    """
+    D = shortest_paths(L)
+    return 1 / np.where(np.isinf(D), 0, D).sum(axis=1)
+
+def closeness_centrality(A : np.ndarray) -> np.ndarray:
+    return closeness_from_lengths(lengths(A))
+
+def betweenness_centrality(A : np.ndarray, rtol: float = 1e-12) -> np.ndarray:
+    """
+    Normalized betweenness on the edge lengths 1 - w. The number of shortest paths sigma[s, t] comes from one
+    linear solve per source over its shortest path DAG, the betweenness of v is then the sum of
+    sigma[s, v] * sigma[v, t] / sigma[s, t] over the pairs s, t whose shortest paths can go through v.
+    """
+    L = lengths(A)
+    n = len(L)
+    D = shortest_paths(L)
+    edges = ~np.isinf(L) & ~np.eye(n, dtype=bool)
+    # dag[s, u, t]: edge u -> t lies on a shortest path from s
+    dag = edges[None] & np.isclose(D[:, :, None] + L[None], D[:, None, :], rtol=rtol, atol=0)
+    sigma = np.linalg.solve(np.eye(n)[None] - dag.transpose(0, 2, 1).astype(float), np.eye(n)[:, :, None])[:, :, 0]
+    # through[s, v, t]: v lies on a shortest path from s to t
+    through = np.isclose(D[:, :, None] + D[None, :, :], D[:, None, :], rtol=rtol, atol=0) & ~np.isinf(D)[:, None, :]
+    index = np.arange(n)
+    through[index, index, :] = False
+    through[:, index, index] = False
+    through[index, :, index] = False
+    pairs = np.where(through, sigma[:, :, None] * sigma[None, :, :] / np.where(sigma > 0, sigma, 1)[:, None, :], 0)
+    scale = 1 / ((n - 1) * (n - 2)) if n > 2 else 1
+    return pairs.sum(axis=(0, 2)) * scale
+
+CENTRALITIES: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "Degree": degree_centrality,
+    "Eigenvector": eigenvector_centrality,
+    "Betweenness": betweenness_centrality,
+    "Closeness": closeness_centrality,
+    "PageRank": pagerank_centrality,
+}
+
+
+class CentralityCache():
+    """
+    Centralities computed on demand from the weight matrix and kept per (graph fingerprint, metric),
+    so asking for one metric never computes the others and asking again is free.
+    """
+    def __init__(self) -> None:
+        self.entries: dict[tuple[str, str], np.ndarray] = {}
+
+    def get(self, G : nx.DiGraph, metric : str) -> np.ndarray:
+        """
+        Centrality of every node of G in node order.
+        """
+        return self.get_many(G, [metric])[metric]
+
+    def get_many(self, G : nx.DiGraph, metrics : list[str]) -> dict[str, np.ndarray]:
+        unknown = [m for m in metrics if m not in CENTRALITIES]
+        if unknown:
+            raise ValueError(f"Unknown metrics {unknown}, use some of {METRICS}")
+        A = adjacency(G)
+        key = fingerprint(A)
+        for metric in metrics:
+            if (key, metric) not in self.entries:
+                self.entries[(key, metric)] = CENTRALITIES[metric](A)
+        return {metric: self.entries[(key, metric)] for metric in metrics}
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+CACHE = CentralityCache()
+
+def _ranking(G : nx.DiGraph, dc : list, values : np.ndarray) -> list[tuple[int, str, float]]:
+    nodes = list(G)
+    order = np.argsort(-values, kind="stable")
+    return [(nodes[i], dc[nodes[i]], float(values[i])) for i in order]
+
 def weighted_degree_ranking(G : nx.DiGraph, dc : list, degree_type : Literal["in", "out"] | None = None) -> list[tuple[int, str, float]]:
     """
     Returns a list [(id, label, weighted degree)], sorted by weighted degree.
@@ -12,28 +158,17 @@ def weighted_degree_ranking(G : nx.DiGraph, dc : list, degree_type : Literal["in
     # Kind off expected, because as long as the text used to get the weights
     # is long enough you would kind off expect all bigrams to appear uniformly.
 
-    if degree_type == "in":
-        weighted_degree = dict(G.in_degree(weight="weight"))
-    elif degree_type == "out":
-        weighted_degree = dict(G.out_degree(weight="weight"))
-    else:
-        weighted_degree = dict(G.degree(weight="weight"))
-
-    s = sorted(weighted_degree, key=lambda i: weighted_degree.get(i), reverse=True)
-    node_labels = {i: x for i, x in enumerate(dc)}
-    out = [(node_id, node_labels[node_id], weighted_degree[node_id]) for node_id in s]
-    return out
+    if degree_type is None:
+        return _ranking(G, dc, CACHE.get(G, "Degree"))
+    W = np.nan_to_num(adjacency(G))
+    return _ranking(G, dc, W.sum(axis=0) if degree_type == "in" else W.sum(axis=1))
 
 def weighted_eigenvector_centrality_ranking(G : nx.DiGraph, dc : list) -> list[tuple[int, str, float]]:
     """
     Returns a list [(id, label, EV centrality)], sorted by eigenvector centrality,
     while taking into account edge weights.
     """
-    eig_centrality = nx.eigenvector_centrality_numpy(G, weight="weight")
-    s = sorted(eig_centrality, key=lambda i: eig_centrality.get(i), reverse=True)
-    node_labels = {i: x for i, x in enumerate(dc)}
-    out = [(node_id, node_labels[node_id], eig_centrality[node_id]) for node_id in s]
-    return out
+    return _ranking(G, dc, CACHE.get(G, "Eigenvector"))
 
 def weighted_betweenness_centrality_ranking(G : nx.DiGraph, dc : list) -> list[tuple[int, str, float]]:
     """
@@ -43,59 +178,32 @@ def weighted_betweenness_centrality_ranking(G : nx.DiGraph, dc : list) -> list[t
 
     # NOTE: betweenness centrality looks for shortest paths, so weights that denote importance
     # (higher is better) like in our case would flip this on it's head, and the nodes
-    # that will be highlighted will actually be the least important nodes. Maybe change
-    # weights: weight_new = 1 - weight_current
-
-    G_tmp = G.copy()
-    for u, v, weight in G_tmp.edges(data=True):
-        weight["weight"] = 1 - weight["weight"]
+    # that will be highlighted will actually be the least important nodes. So the paths use
+    # the lengths 1 - w.
 
-    bet_centrality = nx.betweenness_centrality(G_tmp, weight="weight")
-    s = sorted(bet_centrality, key=lambda i: bet_centrality.get(i), reverse=True)
-    node_labels = {i: x for i, x in enumerate(dc)}
-    out = [(node_id, node_labels[node_id], bet_centrality[node_id]) for node_id in s]
-    return out
+    return _ranking(G, dc, CACHE.get(G, "Betweenness"))
 
 def weighted_closeness_centrality(G : nx.DiGraph) -> dict:
     """
     Weighted closeness centrality implementation, because networkx doesn't have it.
+    Edge weights are used as path lengths.
     """
-    closeness_centrality = {}
-    for node in G.nodes():
-        shortest_paths = nx.single_source_dijkstra_path_length(G, node, weight="weight")
-        total_distance = sum(shortest_paths.values())
-        closeness_centrality[node] = 1 / total_distance
-    return closeness_centrality
+    L = nx.to_numpy_array(G, nodelist=list(G), weight="weight", nonedge=np.inf)
+    return dict(zip(G, closeness_from_lengths(L).tolist()))
 
 def weighted_closeness_centrality_ranking(G : nx.DiGraph, dc : list) -> list[tuple[int, str, float]]:
     """
     Returns a list [(id, label, closeness_centrality)], sorted by closeness centrality,
     while taking into account edge weights.
     """
-    G_tmp = G.copy()
-    for u, v, weight in G_tmp.edges(data=True):
-        weight["weight"] = 1 - weight["weight"]
-
-    close_centrality = weighted_closeness_centrality(G_tmp)
-    s = sorted(close_centrality, key=lambda i: close_centrality.get(i), reverse=True)
-    node_labels = {i: x for i, x in enumerate(dc)}
-    out = [(node_id, node_labels[node_id], close_centrality[node_id]) for node_id in s]
-    return out
+    return _ranking(G, dc, CACHE.get(G, "Closeness"))
 
 def weighted_pagerank_ranking(G : nx.DiGraph, dc : list) -> list[tuple[int, str, float]]:
     """
     Returns a list [(id, label, pagerank_score)], sorted by pagerank score,
     while taking into account edge weights.
     """
-    G_tmp = G.copy()
-    for u, v, weight in G_tmp.edges(data=True):
-        weight["weight"] = 1 - weight["weight"]
-
-    close_centrality = nx.pagerank(G_tmp, weight="weight")
-    s = sorted(close_centrality, key=lambda i: close_centrality.get(i), reverse=True)
-    node_labels = {i: x for i, x in enumerate(dc)}
-    out = [(node_id, node_labels[node_id], close_centrality[node_id]) for node_id in s]
-    return out
+    return _ranking(G, dc, CACHE.get(G, "PageRank"))
 
 def get_rankings(sorted_list) -> list:
     """
@@ -103,26 +211,23 @@ def get_rankings(sorted_list) -> list:
     """
     return [(i+1, sample[0]) for i, sample in enumerate(sorted_list)]
 
-def construct_dataframe(G : nx.DiGraph, dc : list) -> pd.DataFrame:
+def construct_dataframe(G : nx.DiGraph, dc : list, metrics : list[str] | None = None) -> pd.DataFrame:
     """
     Constructs and returns a pandas dataframe that stores characters, their ranking
     for each network analysis metric and their avarage rank. Indexes are node ids.
+    Only the given metrics are computed (all by default), the average needs all of them.
     """
-
-    out_deg = weighted_degree_ranking(G, dc)
-    out_ev = weighted_eigenvector_centrality_ranking(G, dc)
-    out_bet = weighted_betweenness_centrality_ranking(G, dc)
-    out_close = weighted_closeness_centrality_ranking(G, dc)
-    out_pr = weighted_pagerank_ranking(G, dc)
+    metrics = METRICS if metrics is None else [m for m in METRICS if m in metrics]
+    values = CACHE.get_many(G, metrics)
 
     data = pd.DataFrame()
     data["Charecter"] = dc
-    data["Degree"] = [rank for rank, _ in sorted(get_rankings(out_deg), key=lambda i: i[1])]
-    data["Eigenvector"] = [rank for rank, _ in sorted(get_rankings(out_ev), key=lambda i: i[1])]
-    data["Betweenness"] = [rank for rank, _ in sorted(get_rankings(out_bet), key=lambda i: i[1])]
-    data["Closeness"] = [rank for rank, _ in sorted(get_rankings(out_close), key=lambda i: i[1])]
-    data["PageRank"] = [rank for rank, _ in sorted(get_rankings(out_pr), key=lambda i: i[1])]
-    data["Average"] = (data["Degree"] + data["Eigenvector"] + data["Betweenness"] + data["Closeness"] + data["PageRank"])/5
+    for metric in metrics:
+        ranks = np.empty(len(G), dtype=int)
+        ranks[np.argsort(-values[metric], kind="stable")] = np.arange(1, len(G)+1)
+        data[metric] = ranks
+    if len(metrics) == len(METRICS):
+        data["Average"] = (data["Degree"] + data["Eigenvector"] + data["Betweenness"] + data["Closeness"] + data["PageRank"])/5
     return data
 
 def sort_by_column(data : pd.DataFrame, column_name : str) -> pd.DataFrame:
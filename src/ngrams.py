@@ -0,0 +1,231 @@
+import numpy as np
+from collections import Counter
+from typing import Iterable, Optional
+from text_parser import as_chunks
+
+MAX_ALPHABET = 256 # codes are stored as uint8
+
+
+def code_points(text: str) -> np.ndarray:
+    """
+    Unicode code points of text as an integer array (one byte per character for ASCII text).
+    """
+    try:
+        return np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def encode(text: str, chars: list[str]) -> np.ndarray:
+    """
+    Maps text to an uint8 code array, where code i stands for chars[i].
+    Raises ValueError if the text contains a character that is not in chars.
+    """
+    if len(chars) > MAX_ALPHABET:
+        raise ValueError(f"Alphabet has {len(chars)} characters, at most {MAX_ALPHABET} are supported")
+    points = code_points(text)
+    keys = np.array([ord(c) for c in chars], dtype=np.int64)
+    size = max(int(keys.max(initial=-1)), int(points.max(initial=0))) + 1
+    lut = np.full(size, -1, dtype=np.int16)
+    lut[keys] = np.arange(len(chars))
+    codes = lut[points]
+    if np.any(codes < 0):
+        missing = sorted(set(text) - set(chars))
+        raise ValueError(f"Characters {missing} are not in the alphabet")
+    return codes.astype(np.uint8)
+
+def unigram_counts(codes: np.ndarray, n: int) -> np.ndarray:
+    """
+    Unigram count vector of length n.
+    """
+    return np.bincount(codes, minlength=n).astype(np.int64)
+
+def bigram_counts(codes: np.ndarray, n: int, skip: int = 0, start: int = 0) -> np.ndarray:
+    """
+    (n, n) matrix of bigram counts, entry [i, j] counts codes i followed by j after skip letters
+    (skip=0 are ordinary bigrams, skip=1 are skip-letter bigrams, ...).
+    Only bigrams whose second letter is at index >= start + skip + 1 are counted.
+    """
+    d = skip + 1
+    first = codes[start:-d] if d < len(codes) else codes[:0]
+    second = codes[start+d:]
+    index = first.astype(np.intp) * n + second
+    return np.bincount(index, minlength=n*n).reshape(n, n).astype(np.int64)
+
+def trigram_keys(codes: np.ndarray, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+    """
+    Keys (a*256 + b)*256 + c of the trigrams a, b, c in codes, starting at indexes start <= i < stop.
+    The keys do not depend on the alphabet size, so they stay valid when the alphabet grows.
+    """
+    stop = len(codes) - 2 if stop is None else min(stop, len(codes) - 2)
+    c = codes.astype(np.int64)
+    i = np.arange(start, max(start, stop))
+    return (c[i] * MAX_ALPHABET + c[i+1]) * MAX_ALPHABET + c[i+2]
+
+def counts_to_counter(counts: np.ndarray, chars: list[str]) -> Counter[str]:
+    """
+    Converts a bigram count matrix into the Counter[str] shape used by p_matrix and a_matrix.
+    """
+    rows, cols = np.nonzero(counts)
+    return Counter({chars[i]+chars[j]: int(counts[i, j]) for i, j in zip(rows, cols)})
+
+
+class Trigrams():
+    """
+    Sparse trigram counts, stored as sorted unique keys (see trigram_keys) with a count for each key.
+    Only trigrams that actually occur are stored, instead of a dense alphabet^3 tensor.
+    """
+    def __init__(self, keys: Optional[np.ndarray] = None, counts: Optional[np.ndarray] = None) -> None:
+        self.keys = keys if keys is not None else np.zeros(0, dtype=np.int64)
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray) -> "Trigrams":
+        keys, counts = np.unique(keys, return_counts=True)
+        return cls(keys, counts.astype(np.int64))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, other: "Trigrams", scale: float = 1) -> "Trigrams":
+        """
+        Adds scale * other to the counts in place.
+        """
+        if len(other) == 0:
+            return self
+        keys, inverse = np.unique(np.concatenate([self.keys, other.keys]), return_inverse=True)
+        values = np.concatenate([self.counts, other.counts * scale if scale != 1 else other.counts])
+        counts = np.zeros(len(keys), dtype=values.dtype)
+        np.add.at(counts, inverse, values)
+        self.keys, self.counts = keys, counts
+        return self
+
+    def codes(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Codes of the first, second and third letter of every stored trigram.
+        """
+        return self.keys // MAX_ALPHABET**2, self.keys // MAX_ALPHABET % MAX_ALPHABET, self.keys % MAX_ALPHABET
+
+    def recode(self, mapping: np.ndarray) -> "Trigrams":
+        """
+        Trigrams with every code c replaced by mapping[c] (for a reordered alphabet).
+        """
+        a, b, c = (mapping[x] for x in self.codes())
+        keys = (a.astype(np.int64) * MAX_ALPHABET + b) * MAX_ALPHABET + c
+        order = np.argsort(keys)
+        return Trigrams(keys[order], self.counts[order])
+
+    def total(self) -> float:
+        return self.counts.sum()
+
+    def frequencies(self) -> np.ndarray:
+        total = self.total()
+        return self.counts / total if total else np.zeros(len(self.counts))
+
+    def counter(self, chars: list[str]) -> Counter[str]:
+        """
+        Trigram counts as Counter[str] (e.g. {"the": 12, ...}).
+        """
+        a, b, c = self.codes()
+        return Counter({chars[x]+chars[y]+chars[z]: v.item() for x, y, z, v in zip(a, b, c, self.counts)})
+
+
+class NgramCounter():
+    """
+    Accumulates unigram and (skip-)bigram count matrices over a text or a stream of text chunks.
+    If chars is not given (or grow is set) the alphabet is built on the fly, new characters get the next free code.
+    tail continues a previously counted text (its last characters). With trigrams set, sparse trigram counts are kept as well.
+    """
+    def __init__(self, chars: Optional[list[str]] = None, skips: Iterable[int] = (0,), grow: Optional[bool] = None, tail: str = "",
+                 trigrams: bool = False) -> None:
+        self.fixed = not grow if grow is not None else chars is not None
+        self.chars = list(chars) if chars is not None else []
+        self.skips = tuple(sorted(set(skips)))
+        n = len(self.chars)
+        self.unigrams = np.zeros(n, dtype=np.int64)
+        self.bigrams = {skip: np.zeros(shape=(n, n), dtype=np.int64) for skip in self.skips}
+        self.trigrams = Trigrams() if trigrams else None
+        self.head = ""
+        self._tail = np.zeros(0, dtype=np.uint8)
+        if tail:
+            self._extend_alphabet(tail)
+            self._tail = encode(tail[-self.context:], self.chars)
+
+    @property
+    def n(self) -> int:
+        return len(self.chars)
+
+    @property
+    def context(self) -> int:
+        """
+        Number of characters an n-gram spans beyond its first letter (max skip + 1, or 2 with trigrams).
+        """
+        return max(max(self.skips, default=-1) + 1, 2 if self.trigrams is not None else 0)
+
+    @property
+    def tail(self) -> str:
+        """
+        The last context characters seen so far (head holds the first ones).
+        """
+        return "".join(self.chars[c] for c in self._tail)
+
+    def _extend_alphabet(self, chunk: str) -> None:
+        new = sorted(set(chunk).difference(self.chars))
+        if not new:
+            return
+        if self.fixed:
+            raise ValueError(f"Characters {new} are not in the alphabet")
+        self.chars.extend(new)
+        n = self.n
+        self.unigrams = np.pad(self.unigrams, (0, n-len(self.unigrams)))
+        self.bigrams = {skip: np.pad(b, (0, n-len(b))) for skip, b in self.bigrams.items()}
+
+    def update(self, text: str | Iterable[str]) -> "NgramCounter":
+        """
+        Adds the counts of text (a string or an iterable of chunks) to the matrices.
+        Consecutive calls are treated as one continuous text.
+        """
+        keep = self.context
+        for chunk in as_chunks(text):
+            if not chunk:
+                continue
+            if len(self.head) < keep:
+                self.head += chunk[:keep-len(self.head)]
+            self._extend_alphabet(chunk)
+            codes = encode(chunk, self.chars)
+            self.unigrams += unigram_counts(codes, self.n)
+            # Prepend the tail of the previous chunk, so bigrams across chunks are counted exactly once
+            tail = len(self._tail)
+            codes = np.concatenate([self._tail, codes])
+            for skip in self.skips:
+                start = max(0, tail - skip - 1)
+                self.bigrams[skip] += bigram_counts(codes, self.n, skip=skip, start=start)
+            if self.trigrams is not None:
+                self.trigrams.add(Trigrams.from_keys(trigram_keys(codes, start=max(0, tail - 2))))
+            self._tail = codes[-keep:] if keep > 0 else codes[:0]
+        return self
+
+    def counter(self, skip: int = 0) -> Counter[str]:
+        """
+        Bigram counts as Counter[str] (e.g. {"th": 12, ...}).
+        """
+        return counts_to_counter(self.bigrams[skip], self.chars)
+
+
+def boundary_counts(tail: str, head: str, chars: list[str], skip: int = 0) -> np.ndarray:
+    """
+    Counts of the skip-bigrams that start in tail and end in head, i.e. the ones lost when
+    two consecutive pieces of a text are counted separately.
+    """
+    codes = encode(tail + head, chars)
+    n, t, d = len(chars), len(tail), skip + 1
+    i = np.arange(max(0, t - d), min(t, len(codes) - d))
+    index = codes[i].astype(np.intp) * n + codes[i+d]
+    return np.bincount(index, minlength=n*n).reshape(n, n).astype(np.int64)
+
+def boundary_trigrams(tail: str, head: str, chars: list[str]) -> Trigrams:
+    """
+    The trigrams that start in tail and end in head (see boundary_counts).
+    """
+    codes = encode(tail + head, chars)
+    t = len(tail)
+    return Trigrams.from_keys(trigram_keys(codes, start=max(0, t - 2), stop=t))
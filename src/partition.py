@@ -0,0 +1,233 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+from keyboard import KeyboardGeometry
+
+
+class BalancedBisection():
+    """
+    Two part split of the nodes of a weighted (directed) graph, given by its weight matrix W, where both parts
+    should hold the same weight on their internal edges. part[i] is True for the nodes of the first part.
+    Only swaps are made, so the part sizes never change. The internal weights w1, w2 and the weight of every node's
+    edges to each part (s1, s2, in and out edges together) are updated incrementally, so a candidate swap is scored
+    in O(1) and a swap costs O(n).
+    Nodes in fixed are never moved.
+    """
+    def __init__(self, W: np.ndarray, part: np.ndarray, fixed: Sequence[int] = ()) -> None:
+        self.W = np.asarray(W, dtype=float)
+        self.S = self.W + self.W.T
+        self.loops = np.diag(self.W)
+        self.part = np.array(part, dtype=bool)
+        self.movable = np.ones(len(self.part), dtype=bool)
+        self.movable[list(fixed)] = False
+        x = self.part.astype(float)
+        self.s1 = self.S @ x
+        self.s2 = self.S @ (1 - x)
+        self.w1 = float(x @ self.W @ x)
+        self.w2 = float((1 - x) @ self.W @ (1 - x))
+
+    @property
+    def diff(self) -> float:
+        return abs(self.w1 - self.w2)
+
+    @property
+    def score(self) -> float:
+        """
+        Value the searches minimize, the difference of the internal weights.
+        """
+        return self.diff
+
+    def swap_scores(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        score after swapping u and v, broadcast like swap_deltas.
+        """
+        d1, d2 = self.swap_deltas(u, v)
+        return np.abs(self.w1 + d1 - self.w2 - d2)
+
+    def swap_deltas(self, u: np.ndarray, v: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Changes of w1 and w2 when u (in the first part) and v (in the second part) change sides.
+        u and v broadcast, e.g. u[:, None] and v[None, :] score all swaps at once.
+        """
+        both = self.S[u, v] # the edges between u and v stay between the parts
+        d1 = self.s1[v] + self.loops[v] - self.s1[u] + self.loops[u] - both
+        d2 = self.s2[u] + self.loops[u] - self.s2[v] + self.loops[v] - both
+        return d1, d2
+
+    def swap(self, u: int, v: int) -> None:
+        d1, d2 = self.swap_deltas(u, v)
+        self.w1 += float(d1)
+        self.w2 += float(d2)
+        change = self.S[:, v] - self.S[:, u]
+        self.s1 += change
+        self.s2 -= change
+        self.part[u], self.part[v] = False, True
+
+    def random_search(self, rng: np.random.Generator, iterations: int = 1000, tol: float = 1e-4) -> None:
+        """
+        Proposes random swaps and keeps the ones that do not make the balance worse,
+        until the internal weights differ by less than tol.
+        """
+        for _ in range(iterations):
+            if self.score < tol:
+                break
+            first = np.flatnonzero(self.part & self.movable)
+            second = np.flatnonzero(~self.part & self.movable)
+            if len(first) == 0 or len(second) == 0:
+                break
+            u, v = first[rng.integers(len(first))], second[rng.integers(len(second))]
+            if self.swap_scores(u, v) <= self.score:
+                self.swap(u, v)
+
+    def kernighan_lin(self, tol: float = 1e-4, max_passes: int = 10) -> None:
+        """
+        Kernighan-Lin style passes: every pass makes the best swap of the unlocked nodes (even if it is worse)
+        and locks both nodes until no pair is left, then keeps the best score seen during the pass.
+        Stops when a pass does not improve the score or the score is less than tol.
+        """
+        for _ in range(max_passes):
+            if self.score < tol:
+                break
+            start = self.score
+            unlocked = self.movable.copy()
+            swaps, scores = [], []
+            while True:
+                first = np.flatnonzero(self.part & unlocked)
+                second = np.flatnonzero(~self.part & unlocked)
+                if len(first) == 0 or len(second) == 0:
+                    break
+                k = int(np.argmin(self.swap_scores(first[:, None], second[None, :])))
+                u, v = first[k // len(second)], second[k % len(second)]
+                self.swap(u, v)
+                unlocked[[u, v]] = False
+                swaps.append((u, v))
+                scores.append(self.score)
+            best = int(np.argmin(scores)) if scores else -1
+            if best < 0 or scores[best] >= start:
+                best = -1
+            for u, v in reversed(swaps[best+1:]):
+                self.swap(v, u)
+            if best < 0:
+                break
+
+
+class CutBisection(BalancedBisection):
+    """
+    Two part split with the least weight on the edges between the parts, where the first part should hold
+    the share target of the total pi (character frequencies). score = cut weight + balance * |pi mass of the
+    first part - target|. Part sizes are fixed by the initial split, e.g. to the key capacities of two finger groups.
+    """
+    def __init__(self, W: np.ndarray, part: np.ndarray, pi: np.ndarray, target: float, balance: float = 1.0,
+                 fixed: Sequence[int] = ()) -> None:
+        super().__init__(W, part, fixed)
+        self.pi = np.asarray(pi, dtype=float)
+        self.target = target * self.pi.sum()
+        self.balance = balance
+        self.total = float(self.W.sum())
+        self.mass = float(self.pi[self.part].sum())
+
+    @property
+    def cut(self) -> float:
+        return self.total - self.w1 - self.w2
+
+    @property
+    def score(self) -> float:
+        return self.cut + self.balance * abs(self.mass - self.target)
+
+    def swap_scores(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        d1, d2 = self.swap_deltas(u, v)
+        mass = self.mass + self.pi[v] - self.pi[u]
+        return self.cut - d1 - d2 + self.balance * np.abs(mass - self.target)
+
+    def swap(self, u: int, v: int) -> None:
+        super().swap(u, v)
+        self.mass += float(self.pi[v] - self.pi[u])
+
+def balanced_bisection(W: np.ndarray, part: np.ndarray, mode: str = "random", seed: Optional[int] = None,
+                       iterations: int = 1000, tol: float = 1e-4, fixed: Sequence[int] = ()) -> np.ndarray:
+    """
+    Rebalances the split part of the graph with weight matrix W with random swaps (mode="random") or with
+    Kernighan-Lin passes (mode="greedy"). Returns the new part mask.
+    """
+    bisection = BalancedBisection(W, part, fixed)
+    if mode == "random":
+        bisection.random_search(np.random.default_rng(seed), iterations, tol)
+    elif mode == "greedy":
+        bisection.kernighan_lin(tol)
+    else:
+        raise ValueError(f"Unknown bisection mode {mode}, use random or greedy")
+    return bisection.part
+
+def _capacity_split(pi: np.ndarray, size: int) -> np.ndarray:
+    """
+    Initial part mask with size nodes in the first part. The nodes are dealt in the order of pi, to the first part
+    while it is behind its share of the nodes, so both parts start with frequent and rare nodes.
+    """
+    n = len(pi)
+    part = np.zeros(n, dtype=bool)
+    taken = 0
+    for i, node in enumerate(np.argsort(-pi, kind="stable")):
+        if taken < size and taken * n <= i * size:
+            part[node] = True
+            taken += 1
+    return part
+
+def _bisect(W: np.ndarray, pi: np.ndarray, first: list[int], second: list[int], capacity: dict[int, int],
+            balance: float) -> np.ndarray:
+    """
+    Part mask of the nodes that go to the fingers in first, the sides get the share of nodes and pi of their key capacity.
+    """
+    n = len(W)
+    cap1, cap2 = sum(capacity[f] for f in first), sum(capacity[f] for f in second)
+    size = min(max(round(n * cap1 / (cap1 + cap2)), n - cap2), cap1)
+    bisection = CutBisection(W, _capacity_split(pi, size), pi, cap1 / (cap1 + cap2), balance)
+    bisection.kernighan_lin(tol=0)
+    return bisection.part
+
+def _partition_tree(W: np.ndarray, pi: np.ndarray, fingers: list[int], capacity: dict[int, int],
+                    balance: float) -> np.ndarray:
+    """
+    Finger of every node of the graph W, by splitting the fingers in halves and recursing into both.
+    """
+    if len(fingers) == 1 or len(W) == 0:
+        return np.full(len(W), fingers[0])
+    half = len(fingers) // 2
+    part = _bisect(W, pi, fingers[:half], fingers[half:], capacity, balance)
+    labels = np.empty(len(W), dtype=int)
+    for side, group in ((part, fingers[:half]), (~part, fingers[half:])):
+        nodes = np.flatnonzero(side)
+        labels[nodes] = _partition_tree(W[np.ix_(nodes, nodes)], pi[nodes], group, capacity, balance)
+    return labels
+
+def finger_partition(W: np.ndarray, pi: np.ndarray, geometry: KeyboardGeometry, balance: float = 1.0,
+                     processes: Optional[int] = 1) -> np.ndarray:
+    """
+    Splits the characters of the bigram graph with weight matrix W into the hands and then the fingers of the geometry
+    in one call, returns the finger of every character. Every split keeps characters that follow each other together
+    (least cut weight), gives each side the share of pi of its key capacity (weighted by balance) and never more
+    characters than it has keys. With processes other than 1 the hands are split into fingers in parallel, which only
+    pays off for graphs much larger than one keyboard (processes=None uses all CPUs).
+    """
+    W, pi = np.asarray(W, dtype=float), np.asarray(pi, dtype=float)
+    if len(W) > geometry.n:
+        raise ValueError(f"{len(W)} characters do not fit on the {geometry.n} keys of {geometry}")
+    fingers, counts = np.unique(geometry.fingers, return_counts=True)
+    capacity = dict(zip(fingers.tolist(), counts.tolist()))
+    right = set(geometry.fingers[geometry.hands].tolist())
+    hands = [f for f in capacity if f not in right], [f for f in capacity if f in right]
+    if not hands[0] or not hands[1]:
+        return _partition_tree(W, pi, hands[0] or hands[1], capacity, balance)
+
+    part = _bisect(W, pi, hands[0], hands[1], capacity, balance)
+    sides = [np.flatnonzero(part), np.flatnonzero(~part)]
+    tasks = [(W[np.ix_(nodes, nodes)], pi[nodes], hand, capacity, balance) for nodes, hand in zip(sides, hands)]
+    if processes == 1:
+        results = [_partition_tree(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(min(processes or os.cpu_count() or 1, len(tasks))) as pool:
+            results = list(pool.map(_partition_tree, *zip(*tasks)))
+    labels = np.empty(len(W), dtype=int)
+    for nodes, result in zip(sides, results):
+        labels[nodes] = result
+    return labels
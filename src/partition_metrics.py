@@ -0,0 +1,34 @@
+import numpy as np
+from typing import Optional
+
+
+def part_masks(partitions: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    (m, k, n) float masks of a partition (n,) or of m partitions (m, n), given as boolean arrays
+    (True is part 0, False part 1) or as part labels 0..k-1. Nodes labelled -1 are in no part.
+    """
+    partitions = np.atleast_2d(partitions)
+    if partitions.dtype == bool:
+        labels, k = np.where(partitions, 0, 1), 2
+    else:
+        labels = partitions.astype(int)
+        k = int(labels.max()) + 1 if k is None else k
+    return (labels[:, None, :] == np.arange(k)[None, :, None]).astype(float)
+
+def partition_metrics(W: np.ndarray, partitions: np.ndarray, k: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Weight on the internal edges of every part (m, k), the cut weight on the edges between different parts (m,)
+    and the balance, the largest minus the smallest internal weight (m,), of m partitions of the graph with
+    weight matrix W, all from one batched product of the part masks with W.
+    A single partition (n,) gives within (k,) and scalar cut and balance.
+    """
+    masks = part_masks(partitions, k)
+    m, k, n = masks.shape
+    flow = (masks.reshape(m * k, n) @ np.asarray(W, dtype=float)).reshape(m, k, n)
+    within = np.einsum("mkn,mkn->mk", flow, masks)
+    covered = masks.sum(axis=1)
+    cut = np.einsum("mn,mn->m", flow.sum(axis=1), covered) - within.sum(axis=1)
+    balance = within.max(axis=1) - within.min(axis=1)
+    if np.ndim(partitions) == 1:
+        return within[0], cut[0], balance[0]
+    return within, cut, balance
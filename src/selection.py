@@ -0,0 +1,54 @@
+import numpy as np
+from typing import Callable
+
+
+def roulette(costs: np.ndarray, m: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Fitness proportional selection with fitness max(costs) - cost, all m draws with one searchsorted
+    on the cumulative fitness. If all costs are equal every layout is equally likely.
+    """
+    fitness = np.max(costs) - costs
+    total = fitness.sum()
+    if not total > 0:
+        return rng.integers(0, len(costs), size=m)
+    cumulative = np.cumsum(fitness)
+    index = np.searchsorted(cumulative, rng.random(m) * cumulative[-1], side="right")
+    return np.minimum(index, len(costs) - 1)
+
+def tournament(costs: np.ndarray, m: int, rng: np.random.Generator, size: int = 3) -> np.ndarray:
+    """
+    The best of size uniformly drawn layouts (with replacement), for every one of the m draws.
+    """
+    contestants = rng.integers(0, len(costs), size=(m, size))
+    winner = np.argmin(costs[contestants], axis=1)
+    return contestants[np.arange(m), winner]
+
+def rank(costs: np.ndarray, m: int, rng: np.random.Generator, pressure: float = 1.5) -> np.ndarray:
+    """
+    Linear ranking selection, the best layout is drawn pressure times and the worst 2 - pressure times
+    as often as the average one (1 <= pressure <= 2).
+    """
+    n = len(costs)
+    order = np.argsort(costs, kind="stable")
+    if n == 1:
+        return np.zeros(m, dtype=int)
+    position = np.arange(n)[::-1] # n-1 for the best layout, 0 for the worst
+    probabilities = (2 - pressure) / n + 2 * position * (pressure - 1) / (n * (n - 1))
+    cumulative = np.cumsum(probabilities)
+    index = np.minimum(np.searchsorted(cumulative, rng.random(m) * cumulative[-1], side="right"), n - 1)
+    return order[index]
+
+SELECTIONS: dict[str, Callable[..., np.ndarray]] = {
+    "roulette": roulette,
+    "tournament": tournament,
+    "rank": rank,
+}
+
+def select(costs: np.ndarray, m: int, rng: np.random.Generator, method: str = "roulette", **options) -> np.ndarray:
+    """
+    Indexes of m layouts drawn from a population with costs (lower is better), e.g. the parents of a generation.
+    options are passed to the method (size for tournament, pressure for rank).
+    """
+    if method not in SELECTIONS:
+        raise ValueError(f"Unknown selection {method}, use one of {list(SELECTIONS)}")
+    return SELECTIONS[method](np.asarray(costs, dtype=float), m, rng, **options)
@@ -0,0 +1,92 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+from cost_model import CostModel, FitnessCache
+from keyboard import KeyboardGeometry
+from ngrams import Trigrams
+
+_worker = {} # shared memory, cost model and fitness cache of a worker process
+
+
+class SharedArrays():
+    """
+    Read-only numpy arrays packed into one shared memory block. Worker processes attach to it through
+    spec, so the matrices are not pickled for every task.
+    """
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        layout, offset = [], 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += -(-array.nbytes // 8) * 8 # keep every array 8 byte aligned
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.spec = (self.memory.name, layout)
+        for (name, _, _, _), view in zip(layout, self.views(self.memory, layout).values()):
+            view[...] = arrays[name]
+
+    @staticmethod
+    def views(memory: shared_memory.SharedMemory, layout: list) -> dict[str, np.ndarray]:
+        views = {}
+        for name, dtype, shape, offset in layout:
+            views[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+        return views
+
+    @staticmethod
+    def attach(spec: tuple) -> tuple[shared_memory.SharedMemory, dict[str, np.ndarray]]:
+        name, layout = spec
+        memory = shared_memory.SharedMemory(name=name)
+        arrays = SharedArrays.views(memory, layout)
+        for array in arrays.values():
+            array.flags.writeable = False
+        return memory, arrays
+
+    def close(self) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+
+def model_arrays(model: CostModel) -> dict[str, np.ndarray]:
+    arrays = {"P": model.P, "F": model.F, "D": model.D, "R": model.R, "pi": model.pi}
+    if model.trigrams is not None:
+        arrays.update(T=model.T, trigram_keys=model.trigrams.keys, trigram_counts=model.trigrams.counts)
+    return arrays
+
+def model_from_arrays(arrays: dict[str, np.ndarray], weights: tuple[float, float, float, float],
+                      geometry: Optional[KeyboardGeometry] = None) -> CostModel:
+    w1, w2, w3, w4 = weights
+    trigrams = Trigrams(arrays["trigram_keys"], arrays["trigram_counts"]) if "T" in arrays else None
+    return CostModel(arrays["P"], arrays["F"], arrays["D"], arrays["R"], arrays["pi"], w1=w1, w2=w2, w3=w3,
+                     trigrams=trigrams, T=arrays.get("T"), w4=w4, geometry=geometry)
+
+def init_worker(spec: tuple, weights: tuple[float, float, float, float], geometry: Optional[KeyboardGeometry]) -> None:
+    memory, arrays = SharedArrays.attach(spec)
+    _worker["memory"] = memory
+    _worker["model"] = model_from_arrays(arrays, weights, geometry)
+    _worker["cache"] = FitnessCache()
+
+def worker_model() -> CostModel:
+    """
+    The cost model of a worker process started by model_pool.
+    """
+    return _worker["model"]
+
+def worker_cache() -> FitnessCache:
+    """
+    The fitness cache of a worker process, shared by all tasks the worker runs.
+    """
+    return _worker["cache"]
+
+@contextmanager
+def model_pool(model: CostModel, processes: int) -> Iterator[ProcessPoolExecutor]:
+    """
+    Process pool whose workers share the matrices of model through shared memory (see worker_model).
+    """
+    weights = (model.w1, model.w2, model.w3, model.w4)
+    shared = SharedArrays(model_arrays(model))
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(shared.spec, weights, model.geometry)) as pool:
+            yield pool
+    finally:
+        shared.close()
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def diversity(layouts: np.ndarray) -> float:
+    """
+    Mean pairwise position disagreement of a population of layouts (rows): the fraction of keys on which
+    two layouts differ, averaged over all pairs. 0 when all layouts are equal.
+    Computed from the per key character counts, so it is linear in the population size.
+    """
+    m, n = layouts.shape
+    if m < 2:
+        return 0.0
+    index = np.arange(n) * n + layouts.astype(np.intp)
+    counts = np.bincount(index.ravel(), minlength=n*n)
+    agreeing = (counts * (counts - 1) // 2).sum()
+    return float(1 - agreeing / (n * m * (m - 1) / 2))
+
+
+class StagnationMonitor():
+    """
+    Watches the best cost and the diversity of a population. The search stagnates when the best cost has not
+    improved by more than tol for patience generations, or when the diversity falls under min_diversity.
+    After a stagnation is reported the plateau is counted again from zero.
+    """
+    def __init__(self, patience: int = 20, tol: float = 1e-9, min_diversity: float = 0.0) -> None:
+        self.patience = patience
+        self.tol = tol
+        self.min_diversity = min_diversity
+        self.best = np.inf
+        self.since_improvement = 0
+        self.improved = False
+
+    def update(self, best_cost: float, diversity: float) -> bool:
+        """
+        Records one generation, returns whether the search stagnates.
+        """
+        self.improved = best_cost < self.best - self.tol
+        if self.improved:
+            self.best = best_cost
+            self.since_improvement = 0
+        else:
+            self.since_improvement += 1
+        stagnating = self.since_improvement >= self.patience or diversity < self.min_diversity
+        if stagnating:
+            self.since_improvement = 0
+        return stagnating
+
+    def get_state(self) -> dict:
+        return {"best": float(self.best), "since_improvement": self.since_improvement, "improved": self.improved}
+
+    def set_state(self, state: dict) -> None:
+        self.best = state["best"]
+        self.since_improvement = state["since_improvement"]
+        self.improved = state["improved"]
@@ -0,0 +1,38 @@
+import numpy as np
+from typing import Optional
+
+TOL = 1e-12
+MAX_ITER = 10000
+
+
+def stationary_distribution(a_matrix, pi0: Optional[np.ndarray] = None, tol: float = TOL, max_iter: int = MAX_ITER) -> tuple[np.ndarray, dict]:
+    """
+    Stationary probability vector of the Markov chain with transition matrix a_matrix (dense or scipy.sparse),
+    found with power iteration on the lazy chain (A + I) / 2, which has the same stationary vector but is never periodic.
+    Rows without transitions (a character that only ends the text) jump to a uniformly random state.
+    pi0 is the starting vector (e.g. the previous pi when the matrix changed only a little).
+    Returns pi and the diagnostics {"iterations", "residual", "converged"}, where residual is |pi A - pi|_1.
+    """
+    n = a_matrix.shape[0]
+    dangling = np.asarray(a_matrix.sum(axis=1)).ravel() == 0
+    if pi0 is None or len(pi0) != n or not np.sum(pi0) > 0:
+        pi = np.full(n, 1/n)
+    else:
+        pi = np.abs(np.asarray(pi0, dtype=float))
+        pi /= pi.sum()
+
+    def step(x: np.ndarray) -> np.ndarray:
+        y = np.asarray(x @ a_matrix).ravel()
+        return y + x[dangling].sum() / n
+
+    residual = np.inf
+    iterations = 0
+    for iterations in range(1, max_iter+1):
+        moved = step(pi)
+        residual = np.abs(moved - pi).sum()
+        if residual < tol:
+            pi = moved
+            break
+        pi = (pi + moved) / 2
+    pi = pi / pi.sum()
+    return pi, {"iterations": iterations, "residual": float(residual), "converged": bool(residual < tol)}
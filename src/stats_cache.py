@@ -0,0 +1,144 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+from typing import Callable, Optional
+from text_parser import PATTERN, iter_text_chunks
+from corpus_stats import CorpusStats
+from ngrams import Trigrams
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "keynet")
+MAX_BYTES = 256 * 2**20
+FORMAT_VERSION = 3
+
+
+def content_hash(path: str, block_size: int = 2**20) -> str:
+    """
+    Hash of the raw file content, read in blocks so big corpora are never fully in memory.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        while block := file.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+class StatsCache():
+    """
+    On-disk cache of CorpusStats, stored as one .npz file per entry.
+    Entries are keyed by corpus content hash, filter pattern, alphabet ordering and n-gram order (skip, trigrams).
+    When the directory grows over max_bytes the least recently used entries are removed.
+    """
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, path: str, pattern: str = PATTERN, chars: Optional[list[str]] = None, skip: int = 0, variant: str = "",
+            trigrams: bool = False) -> str:
+        """
+        Cache key of a corpus. variant distinguishes different preprocessing of the same file.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        alphabet = "\0".join(chars) if chars is not None else "<sorted>"
+        for part in (str(FORMAT_VERSION), content_hash(path), pattern, alphabet, str(skip), str(trigrams), variant):
+            h.update(part.encode("utf-8"))
+            h.update(b"\1")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key: str) -> Optional[CorpusStats]:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                unigrams = data["unigrams"] if "unigrams" in data else None
+                trigrams = Trigrams(data["trigram_keys"], data["trigram_counts"]) if "trigram_keys" in data else None
+                stats = CorpusStats(data["counts"], list(data["chars"]), unigrams, int(data["skip"]), str(data["tail"]), trigrams)
+                stats.pi = data["pi"]
+                stats.pi_info = {"iterations": int(data["pi_iterations"]), "residual": float(data["pi_residual"]),
+                                 "converged": bool(data["pi_converged"])}
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None
+        os.utime(path) # mark as recently used
+        return stats
+
+    def store(self, key: str, stats: CorpusStats) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = {"counts": stats.counts, "chars": np.array(stats.chars), "pi": stats.pi, "skip": stats.skip, "tail": stats.tail}
+        # the solver diagnostics exist once pi is computed
+        arrays.update({"pi_" + name: value for name, value in stats.pi_info.items()})
+        if stats.unigrams is not None:
+            arrays["unigrams"] = stats.unigrams
+        if stats.trigrams is not None:
+            arrays["trigram_keys"] = stats.trigrams.keys
+            arrays["trigram_counts"] = stats.trigrams.counts
+        # Write to a temporary file first, so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def get(self, path: str, pattern: str = PATTERN, chars: Optional[list[str]] = None, skip: int = 0,
+            variant: str = "", compute: Optional[Callable[[str], CorpusStats]] = None, trigrams: bool = False) -> CorpusStats:
+        """
+        Returns the statistics of the corpus at path, computing and storing them on a cache miss.
+        By default the corpus is streamed with text_parser.iter_text_chunks, compute(path) can replace that
+        (pass a matching variant so its results do not collide with the default ones).
+        """
+        key = self.key(path, pattern, chars, skip, variant, trigrams)
+        stats = self.load(key)
+        if stats is None:
+            if compute is None:
+                stats = CorpusStats.from_text(iter_text_chunks(path, pattern=pattern), chars=chars, skip=skip, trigrams=trigrams)
+            else:
+                stats = compute(path)
+            self.store(key, stats)
+        return stats
+
+    def invalidate(self, path: str, pattern: str = PATTERN, chars: Optional[list[str]] = None, skip: int = 0, variant: str = "",
+                   trigrams: bool = False) -> bool:
+        """
+        Removes a single entry, returns whether it existed.
+        """
+        try:
+            os.remove(self._path(self.key(path, pattern, chars, skip, variant, trigrams)))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self) -> None:
+        for name, _, _ in self._entries():
+            os.remove(os.path.join(self.directory, name))
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        """
+        Returns [(file name, last use, size)] of all entries, least recently used first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                st = entry.stat()
+                entries.append((entry.name, st.st_mtime, st.st_size))
+        return sorted(entries, key=lambda e: e[1])
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self) -> None:
+        """
+        Removes least recently used entries until the cache fits into max_bytes.
+        """
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for name, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
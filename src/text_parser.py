@@ -1,21 +1,106 @@
+import io
+import os
 import re
+from typing import Iterable, Iterator, Optional
 
-def parse_text(path: str) -> str:
+# TODO: symbols that are passed through can be changed here (Right now we have these four: ,.-')
+# We can also join:
+# - and _ in one key
+# , and ; in one key
+# . and : in one key
+# ' and ? in one key
+PATTERN = r"[^a-zA-Z,.\-\:'\s]"
+CHUNK_SIZE = 1 << 20
+RANGE_BYTES = 64 << 20
+
+_WHITESPACE = str.maketrans("", "", " \n\t")
+
+def normalize_text(content: str, pattern: str = PATTERN) -> str:
+    """
+    Remove all unneeded symbols from content and lower case it.
+    Every step only looks at a single character, so chunks of a text can be normalized independently.
+    """
+    content = re.sub(pattern, "", content)
+    content = content.lower()
+    return content.translate(_WHITESPACE)
+
+def parse_text(path: str, pattern: str = PATTERN) -> str:
     """
     Read the .txt file at provided path.
     Remove all unneeded symbols.
     Returns the string of lower case letters (plus 4 symbols).
     """
-    # TODO: symbols that are passed through can be changed here (Right now we have these four: ,.-')
-    # We can also join:
-    # - and _ in one key
-    # , and ; in one key
-    # . and : in one key
-    # ' and ? in one key
-    pattern = r"[^a-zA-Z,.\-\:'\s]" 
     with open(path, "r", encoding="utf-8") as file:
         content = file.read()
-    content = re.sub(pattern, "", content)
-    content = content.lower()
-    content = content.replace(" ", "").replace("\n", "").replace("\t", "")
-    return content
+    return normalize_text(content, pattern)
+
+class _RangeReader(io.RawIOBase):
+    """
+    Raw binary stream over the bytes [start, end) of a file.
+    """
+    def __init__(self, path: str, start: int, end: Optional[int]) -> None:
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = (end - start) if end is not None else None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining is not None:
+            buffer = memoryview(buffer)[:self.remaining]
+        n = self.file.readinto(buffer)
+        if self.remaining is not None:
+            self.remaining -= n
+        return n
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+def iter_text_chunks(path: str, chunk_size: int = CHUNK_SIZE, pattern: str = PATTERN, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """
+    Streaming version of parse_text. Reads the file at provided path in chunks of chunk_size characters
+    and yields each chunk normalized the same way as parse_text (empty chunks are skipped).
+    Joining the chunks gives exactly the output of parse_text, but only one chunk is held in memory.
+    start and end limit reading to a byte range of the file (see split_ranges).
+    """
+    raw = io.BufferedReader(_RangeReader(path, start, end))
+    with io.TextIOWrapper(raw, encoding="utf-8") as file:
+        while chunk := file.read(chunk_size):
+            chunk = normalize_text(chunk, pattern)
+            if chunk:
+                yield chunk
+
+def as_chunks(text: str | Iterable[str]) -> Iterable[str]:
+    """
+    Lets functions accept either a whole text or a stream of chunks (e.g. from iter_text_chunks).
+    """
+    if isinstance(text, str):
+        return (text,)
+    return text
+
+def split_ranges(path: str, range_bytes: int = RANGE_BYTES) -> list[tuple[int, int]]:
+    """
+    Splits the file at provided path into byte ranges [(start, end)] of roughly range_bytes.
+    Ranges start right after a newline, so no UTF-8 character or line ending is cut in half.
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as file:
+        pos = range_bytes
+        while pos < size:
+            file.seek(pos)
+            # advance to the next newline
+            while block := file.read(CHUNK_SIZE):
+                i = block.find(b"\n")
+                if i >= 0:
+                    pos += i + 1
+                    break
+                pos += len(block)
+            if pos >= size:
+                break
+            bounds.append(pos)
+            pos += range_bytes
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
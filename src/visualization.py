@@ -2,21 +2,21 @@ import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.patches as patches
 import seaborn as sns
-from text_parser import parse_text
+from text_parser import iter_text_chunks
 
 def get_heat(keyboard_array: np.ndarray, text_path : str):
     heat = np.zeros_like(keyboard_array, dtype=float)
-    parsed_text = parse_text(text_path)
     # create dictionary for chars and their positions in the keyboard
     char_to_position = {}
     for i, row in enumerate(keyboard_array):
         for j, char in enumerate(row):
             char_to_position[char] = (i,j)
     # go through every char in text and increase their heat
-    for char in parsed_text:
-        if char in char_to_position:
-            pos = char_to_position[char]
-            heat[pos[0], pos[1]] += 1
+    for chunk in iter_text_chunks(text_path):
+        for char in chunk:
+            if char in char_to_position:
+                pos = char_to_position[char]
+                heat[pos[0], pos[1]] += 1
     # normalize the array
     heat = (heat - np.min(heat)) / (np.max(heat) - np.min(heat))
     return heat